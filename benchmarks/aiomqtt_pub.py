@@ -0,0 +1,24 @@
+import asyncio
+import aiomqtt
+
+from benchmarks import config as c
+
+
+async def main():
+    window = asyncio.Semaphore(c.PUB_WINDOW)
+
+    def release(_):
+        window.release()
+
+    async with aiomqtt.Client(c.HOST, max_inflight_messages=c.PUB_WINDOW) as client:
+        async with asyncio.TaskGroup() as tg:
+            for i in range(c.LIMIT):
+                await window.acquire()
+                task = tg.create_task(
+                    client.publish(c.TOPICS[i % c.PUB_TOPICS], c.PAYLOAD, c.QOS)
+                )
+                task.add_done_callback(release)
+        print("DONE")
+
+
+asyncio.run(main())
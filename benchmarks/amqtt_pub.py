@@ -0,0 +1,27 @@
+import asyncio
+
+from amqtt.client import MQTTClient
+
+from benchmarks import config as c
+
+
+async def main():
+    window = asyncio.Semaphore(c.PUB_WINDOW)
+
+    def release(_):
+        window.release()
+
+    client = MQTTClient()
+    await client.connect(f"mqtt://{c.HOST}:{c.PORT}/")
+    async with asyncio.TaskGroup() as tg:
+        for i in range(c.LIMIT):
+            await window.acquire()
+            task = tg.create_task(
+                client.publish(c.TOPICS[i % c.PUB_TOPICS], c.PAYLOAD, c.QOS)
+            )
+            task.add_done_callback(release)
+    print("DONE")
+    await client.disconnect()
+
+
+asyncio.run(main())
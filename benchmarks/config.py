@@ -6,3 +6,18 @@ TOPIC = "benchmark"
 QOS = int(os.getenv("MQTT_QOS") or 0)
 LIMIT = int(os.getenv("MQTT_LIMIT") or 1_000_000)
 INTERVAL = int(os.getenv("PUB_INTERVAL") or 0)
+MESSAGE_VIEW = bool(os.getenv("MESSAGE_VIEW"))
+MAX_PACKETS = int(os.getenv("MAX_PACKETS") or 0)
+UVLOOP = bool(os.getenv("UVLOOP"))
+PAYLOAD_SIZE = int(os.getenv("PAYLOAD_SIZE") or 16)
+PUB_TOPICS = int(os.getenv("PUB_TOPICS") or 1)
+# unacknowledged messages a publisher may have outstanding
+PUB_WINDOW = int(os.getenv("PUB_WINDOW") or 1000)
+
+PAYLOAD = b"x" * PAYLOAD_SIZE
+TOPICS = [f"{TOPIC}/{i}" for i in range(PUB_TOPICS)]
+# latency benchmark: offered load in messages/s and how long it's offered
+LAT_RATE = int(os.getenv("LAT_RATE") or 10_000)
+LAT_DURATION = float(os.getenv("LAT_DURATION") or 10)
+# the subscriber gives up on the rest after this many idle seconds
+LAT_IDLE = float(os.getenv("LAT_IDLE") or 5)
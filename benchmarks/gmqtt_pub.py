@@ -0,0 +1,21 @@
+import asyncio
+
+from gmqtt import Client as MQTTClient
+
+from benchmarks import config as c
+
+
+# gmqtt has no publish acknowledgement callback: messages are handed to the
+# transport, yielding every window so it can flush, and disconnect drains the rest
+async def main(host):
+    client = MQTTClient("gmqtt")
+    await client.connect(host)
+    for i in range(c.LIMIT):
+        client.publish(c.TOPICS[i % c.PUB_TOPICS], c.PAYLOAD, qos=c.QOS)
+        if not i % c.PUB_WINDOW:
+            await asyncio.sleep(0)
+    print("DONE")
+    await client.disconnect()
+
+
+asyncio.run(main(c.HOST))
@@ -0,0 +1,67 @@
+import struct
+import time
+
+from pymosquitto.profiler import Histogram
+
+from benchmarks import config as c
+
+# sequence number, scheduled send time (time.monotonic_ns)
+HEADER = struct.Struct("<Qq")
+# the publisher ends with this sequence number, carrying the count it sent
+END = 0xFFFFFFFFFFFFFFFF
+
+
+def encode(seq, sent_ns, size=0):
+    header = HEADER.pack(seq, sent_ns)
+    return header + b"x" * (size - len(header))
+
+
+class Tracker:
+    def __init__(self, module):
+        self.module = module
+        self.hist = Histogram()
+        self.expected = 0
+        self.received = 0
+        self.gaps = 0
+        self.reordered = 0
+        self.sent = None
+        self.last_ns = time.monotonic_ns()
+
+    # returns True on the end marker
+    def on_payload(self, payload, now_ns):
+        seq, sent_ns = HEADER.unpack_from(payload)
+        self.last_ns = now_ns
+        if seq == END:
+            self.sent = sent_ns
+            return True
+        self.hist.record(now_ns - sent_ns)
+        self.received += 1
+        if seq == self.expected:
+            self.expected += 1
+        elif seq > self.expected:
+            self.gaps += 1
+            self.expected = seq + 1
+        else:
+            # arrived after a later message, it was counted in a gap
+            self.reordered += 1
+        return False
+
+    def idle(self):
+        return time.monotonic_ns() - self.last_ns > c.LAT_IDLE * 1e9
+
+    def report(self):
+        # without the end marker, count up to the highest sequence number seen
+        sent = self.expected if self.sent is None else self.sent
+        lost = max(0, sent - self.received)
+        ns = [self.hist.percentile(p) for p in (50, 99, 99.9)] + [self.hist.max]
+        fields = [
+            self.module,
+            c.LAT_RATE,
+            sent,
+            self.received,
+            lost,
+            f"{lost / sent * 100 if sent else 0:.3f}",
+            self.gaps,
+            self.reordered,
+        ] + [f"{v / 1000:.1f}" for v in ns]
+        print("RESULT " + ";".join(map(str, fields)), flush=True)
@@ -0,0 +1,37 @@
+import threading
+import time
+
+from pymosquitto import Mosquitto as Client
+
+from benchmarks import config as c
+from benchmarks.latency import END, encode
+
+# publishes at a fixed rate, stamping each message with the time it was due rather
+# than the time it went out, so a stalled publisher shows up as latency too
+interval_ns = int(1e9 / c.LAT_RATE)
+total = int(c.LAT_RATE * c.LAT_DURATION)
+
+connected = threading.Event()
+client = Client()
+client.on_connect = lambda *_: connected.set()
+client.connect(c.HOST, c.PORT)
+client.loop_start()
+connected.wait()
+
+started = time.monotonic_ns()
+seq = 0
+while seq < total:
+    now = time.monotonic_ns()
+    due = min(total, (now - started) // interval_ns + 1)
+    while seq < due:
+        client.publish(
+            c.TOPIC, encode(seq, started + seq * interval_ns, c.PAYLOAD_SIZE), c.QOS
+        )
+        seq += 1
+    time.sleep(max(0, started + seq * interval_ns - time.monotonic_ns()) / 1e9)
+
+elapsed = (time.monotonic_ns() - started) / 1e9
+client.publish(c.TOPIC, encode(END, total, c.PAYLOAD_SIZE), 1)
+print(f"sent {total} messages in {elapsed:.2f}s ({total / elapsed:.0f} msgs/s)")
+client.disconnect()
+client.loop_stop(False)
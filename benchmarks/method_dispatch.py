@@ -0,0 +1,85 @@
+import ctypes as C
+import time
+import types
+import weakref
+
+from pymosquitto.bindings import bind, libmosq
+from pymosquitto.client import Mosquitto
+
+from benchmarks import config as c
+
+AMOUNT = 200_000
+
+
+# the previous descriptor: resolves the method on every access and goes through `Mosquitto.call`
+class LegacyMethod:
+    def __init__(self, restype, func, *argtypes, **kwargs):
+        self._func = bind(restype, func, *argtypes)
+        self._kwargs = kwargs
+
+    def __get__(self, obj, objtype=None):
+        method_name = self._func.__name__
+
+        if not hasattr(obj, method_name):
+
+            def method(self_, *args):
+                return self_.call(self._func, self_.ptr, *args, **self._kwargs)
+
+            setattr(obj, method_name, types.MethodType(method, weakref.proxy(obj)))
+
+        return getattr(obj, method_name)
+
+
+class Client(Mosquitto):
+    legacy_publish = LegacyMethod(
+        C.c_int,
+        libmosq.mosquitto_publish,
+        C.c_void_p,
+        C.POINTER(C.c_int),
+        C.c_char_p,
+        C.c_int,
+        C.c_void_p,
+        C.c_int,
+        C.c_bool,
+        auto_encode=False,
+    )
+    legacy_loop_read = LegacyMethod(
+        C.c_int, libmosq.mosquitto_loop_read, C.c_void_p, C.c_int
+    )
+
+
+def bench(func, *args):
+    started = time.perf_counter_ns()
+    for _ in range(AMOUNT):
+        func(*args)
+    return (time.perf_counter_ns() - started) / AMOUNT
+
+
+def main():
+    client = Client()
+    client.connect(c.HOST, c.PORT)
+    mid = C.byref(C.c_int(0))
+    payload = b"x" * 16
+    cases = {
+        "publish": (
+            lambda: client.legacy_publish,
+            lambda: client._publish,
+            (mid, b"benchmark", len(payload), payload, 0, False),
+        ),
+        "loop_read": (
+            lambda: client.legacy_loop_read,
+            lambda: client.loop_read,
+            (1,),
+        ),
+    }
+    print("Method;Legacy ns/call;Compiled ns/call")
+    for name, (legacy, compiled, args) in cases.items():
+        # the attribute lookup is part of the measured overhead
+        legacy_ns = bench(lambda: legacy()(*args))
+        compiled_ns = bench(lambda: compiled()(*args))
+        print(f"{name};{legacy_ns:.0f};{compiled_ns:.0f}")
+    client.disconnect()
+
+
+if __name__ == "__main__":
+    main()
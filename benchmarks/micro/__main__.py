@@ -0,0 +1,131 @@
+import argparse
+import gc
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from pymosquitto.client import LIBMOSQ_VERSION, Mosquitto
+
+from benchmarks.micro.broker import local_broker
+from benchmarks.micro.cases import CASES
+
+
+# best of `repeat` untraced runs for the time
+def measure(func, number, repeat):
+    func()
+    best_ns = None
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter_ns()
+            for _ in itertools.repeat(None, number):
+                func()
+            elapsed = time.perf_counter_ns() - started
+            if best_ns is None or elapsed < best_ns:
+                best_ns = elapsed
+    finally:
+        gc.enable()
+    return best_ns / number
+
+
+# a separate traced run, tracemalloc slows every allocation down: the mean peak of
+# memory allocated during one op, and the memory still held after the run
+def measure_memory(func, number):
+    gc.disable()
+    tracemalloc.start()
+    try:
+        peak = 0
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in itertools.repeat(None, number):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func()
+            peak += tracemalloc.get_traced_memory()[1] - before
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    return peak / number, retained / number
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.micro")
+    parser.add_argument("-n", "--number", type=int, default=100_000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "-m", "--mem-number", type=int, default=10_000, help="ops in the traced run"
+    )
+    parser.add_argument("-k", "--filter", default="", help="run cases containing this")
+    parser.add_argument("--save", help="write the results to a JSON file")
+    parser.add_argument("--compare", help="compare with the results in a JSON file")
+    parser.add_argument(
+        "--fake-broker",
+        action="store_true",
+        help="use the in-process broker stand-in even if mosquitto is installed",
+    )
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    with local_broker(args.fake_broker) as broker:
+        connected = []
+        client = Mosquitto()
+        client.on_connect = lambda *_: connected.append(True)
+        client.connect(broker.host, broker.port)
+        while not connected:
+            client.loop(100, 1)
+        client.on_connect = None
+        print(f"broker: {broker.kind}", file=sys.stderr)
+        print(
+            "Case;ns/op;peak B/op;retained B/op"
+            + (";baseline ns/op;change" if baseline else "")
+        )
+        for name, make in CASES.items():
+            if args.filter not in name:
+                continue
+            func = make(client)
+            ns = measure(func, args.number, args.repeat)
+            peak, retained = measure_memory(func, args.mem_number)
+            # drain what the publish cases queued, so the next case starts clean
+            while client.want_write():
+                client.loop_write(1)
+            results[name] = {
+                "ns_per_op": ns,
+                "peak_bytes_per_op": peak,
+                "retained_bytes_per_op": retained,
+            }
+            line = f"{name};{ns:.0f};{peak:.0f};{retained:.1f}"
+            if name in baseline:
+                base = baseline[name]["ns_per_op"]
+                line += f";{base:.0f};{(ns - base) / base:+.1%}"
+            print(line)
+        client.disconnect()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "python": platform.python_version(),
+                        "libmosquitto": ".".join(map(str, LIBMOSQ_VERSION)),
+                        "broker": broker.kind,
+                        "number": args.number,
+                        "repeat": args.repeat,
+                        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import shutil
+import socket
+import subprocess
+import threading
+import time
+
+# CONNACK, session not present, accepted (MQTT 3.1.1)
+CONNACK = b"\x20\x02\x00\x00"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _recv_packet(conn):
+    header = conn.recv(1)
+    if not header:
+        return None
+    length, shift = 0, 0
+    while True:
+        byte = conn.recv(1)[0]
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    body = b""
+    while len(body) < length:
+        chunk = conn.recv(length - len(body))
+        if not chunk:
+            return None
+        body += chunk
+    return header + body
+
+
+class FakeBroker:
+    # accepts MQTT 3.1.1 connections and discards everything they send,
+    # enough for measuring the client side of publishing
+    kind = "fake"
+
+    def __init__(self):
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.host, self.port = self._server.getsockname()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._server.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            if _recv_packet(conn) is None:
+                return
+            conn.sendall(CONNACK)
+            while conn.recv(1 << 16):
+                pass
+
+
+class MosquittoBroker:
+    kind = "mosquitto"
+
+    def __init__(self, binary):
+        self._binary = binary
+        self.host = "127.0.0.1"
+        self.port = _free_port()
+        self._proc = None
+
+    def __enter__(self):
+        self._proc = subprocess.Popen(
+            [self._binary, "-p", str(self.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 5
+        while True:
+            try:
+                socket.create_connection((self.host, self.port), 0.1).close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self._proc.kill()
+                    raise RuntimeError("mosquitto didn't start")
+                time.sleep(0.05)
+
+    def __exit__(self, *_):
+        self._proc.terminate()
+        self._proc.wait()
+
+
+def local_broker(fake=False):
+    binary = None if fake else shutil.which("mosquitto")
+    return MosquittoBroker(binary) if binary else FakeBroker()
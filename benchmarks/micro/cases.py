@@ -0,0 +1,144 @@
+import ctypes as C
+import functools
+import itertools
+import typing as t
+
+from pymosquitto import helpers as h
+from pymosquitto.bindings import MQTTMessageStruct, MQTT5PropertyStruct
+from pymosquitto.client import (
+    _EVENTS,
+    Mosquitto,
+    MQTTMessage,
+    MQTT5Property,
+    Properties,
+    PropertyList,
+)
+from pymosquitto.constants import MQTT5PropertyID
+
+from benchmarks.topic_matcher import make_filters, make_topics
+
+CASES: dict[str, t.Callable[..., t.Any]] = {}
+
+# objects the timed callables point into
+_refs: list[t.Any] = []
+
+TOPIC = "bench/micro"
+PAYLOAD = b"x" * 16
+PROPS = {
+    MQTT5PropertyID.CONTENT_TYPE: "application/json",
+    MQTT5PropertyID.MESSAGE_EXPIRY_INTERVAL: 60,
+    MQTT5PropertyID.USER_PROPERTY: [("source", "bench"), ("seq", "1")],
+}
+
+
+# a case takes the connected client and returns the callable to time
+def case(name):
+    def decorator(func):
+        CASES[name] = func
+        return func
+
+    return decorator
+
+
+def _noop(*_):
+    pass
+
+
+def _message_struct():
+    payload = C.create_string_buffer(PAYLOAD, len(PAYLOAD))
+    _refs.append(payload)
+    msg = MQTTMessageStruct(
+        mid=1,
+        topic=TOPIC.encode(),
+        payload=C.cast(payload, C.c_void_p),
+        payloadlen=len(PAYLOAD),
+        qos=0,
+        retain=False,
+    )
+    return C.pointer(msg)
+
+
+def _trampoline(message_view):
+    client = Mosquitto(message_view=message_view)
+    client.on_message = _noop
+    wrapped = _EVENTS["message"][1]
+    # goes through the ctypes thunk just like a call from libmosquitto
+    return functools.partial(wrapped, None, client, _message_struct(), None)
+
+
+def _props_ptr(props):
+    _refs.append(props)
+    return C.cast(props._as_parameter_, C.POINTER(MQTT5PropertyStruct))
+
+
+@case("method.want_write")
+def method_want_write(client):
+    return client.want_write
+
+
+@case("publish.qos0")
+def publish_qos0(client):
+    return functools.partial(client.publish, TOPIC, PAYLOAD)
+
+
+@case("publish.prepared")
+def publish_prepared(client):
+    return functools.partial(client.prepare_publish(TOPIC).send, PAYLOAD)
+
+
+@case("trampoline.message")
+def trampoline_message(client):
+    return _trampoline(False)
+
+
+@case("trampoline.message_view")
+def trampoline_message_view(client):
+    return _trampoline(True)
+
+
+@case("message.from_struct")
+def message_from_struct(client):
+    return functools.partial(MQTTMessage.from_struct, _message_struct())
+
+
+@case("properties.get")
+def properties_get(client):
+    ptr = _props_ptr(PropertyList(PROPS))
+
+    def run():
+        view = Properties(ptr)
+        view.get(MQTT5PropertyID.CONTENT_TYPE)
+        view.release()
+
+    return run
+
+
+@case("properties.from_struct")
+def properties_from_struct(client):
+    return functools.partial(MQTT5Property.from_struct, _props_ptr(PropertyList(PROPS)))
+
+
+@case("property_list.build")
+def property_list_build(client):
+    return lambda: PropertyList(PROPS).close()
+
+
+@case("property_list.cached")
+def property_list_cached(client):
+    return functools.partial(PropertyList.cached, PROPS)
+
+
+@case("topic.matches_sub")
+def topic_matches_sub(client):
+    return functools.partial(
+        h.topic_matches_sub, "devices/+/telemetry", "devices/42/telemetry"
+    )
+
+
+@case("topic.matcher_1k")
+def topic_matcher_1k(client):
+    matcher = h.TopicMatcher(cache_size=0)
+    for sub in make_filters(1000):
+        matcher.set_topic_callback(sub, _noop)
+    topics = itertools.cycle(make_topics(1000))
+    return lambda: matcher.find(next(topics))
@@ -0,0 +1,22 @@
+import asyncio
+import sys
+
+import mqttools
+
+from benchmarks import config as c
+
+
+# mqttools only publishes with QoS 0 and has no flow control, so it yields
+# every window to let the transport flush
+async def main():
+    if c.QOS:
+        sys.exit(f"mqttools doesn't support publishing with QoS {c.QOS}")
+    async with mqttools.Client(c.HOST, c.PORT) as client:
+        for i in range(c.LIMIT):
+            client.publish(mqttools.Message(c.TOPICS[i % c.PUB_TOPICS], c.PAYLOAD))
+            if not i % c.PUB_WINDOW:
+                await asyncio.sleep(0)
+        print("DONE")
+
+
+asyncio.run(main())
@@ -0,0 +1,33 @@
+import threading
+
+import paho.mqtt.client as mqtt
+from benchmarks import config as c
+
+window = threading.Semaphore(c.PUB_WINDOW)
+done = threading.Event()
+
+
+def on_publish(client, userdata, mid, reason_code, props):
+    global count
+    window.release()
+    count += 1
+    if count == c.LIMIT:
+        done.set()
+
+
+count = 0
+connected = threading.Event()
+client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+client.max_inflight_messages_set(c.PUB_WINDOW)
+client.on_connect = lambda *_: connected.set()
+client.on_publish = on_publish
+client.connect(c.HOST, c.PORT, 60)
+client.loop_start()
+connected.wait()
+for i in range(c.LIMIT):
+    window.acquire()
+    client.publish(c.TOPICS[i % c.PUB_TOPICS], c.PAYLOAD, c.QOS)
+done.wait()
+print("DONE")
+client.disconnect()
+client.loop_stop()
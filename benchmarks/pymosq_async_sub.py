@@ -25,4 +25,9 @@ async def main():
                 break
 
 
-asyncio.run(main())
+if c.UVLOOP:
+    import uvloop
+
+    uvloop.run(main())
+else:
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+import threading
+import time
+
+from pymosquitto import Mosquitto as Client
+
+from benchmarks import config as c
+from benchmarks.latency import Tracker
+
+tracker = Tracker("pymosq_batch")
+done = threading.Event()
+
+
+# every message of a batch is stamped when the batch is delivered
+def on_messages(client, userdata, batch):
+    now = time.monotonic_ns()
+    for msg in batch:
+        if tracker.on_payload(msg.payload, now):
+            done.set()
+
+
+client = Client()
+client.on_connect = lambda *_: client.subscribe(c.TOPIC, c.QOS)
+client.on_messages = on_messages
+client.connect_async(c.HOST, c.PORT)
+thread = threading.Thread(target=client.loop_forever)
+thread.start()
+while not done.wait(0.5) and not tracker.idle():
+    pass
+client.disconnect()
+thread.join()
+tracker.report()
@@ -0,0 +1,18 @@
+from pymosquitto import Mosquitto as Client
+
+from benchmarks import config as c
+
+
+def on_messages(client, userdata, batch):
+    global count
+    count += len(batch)
+    if count >= c.LIMIT:
+        client.disconnect()
+
+
+count = 0
+client = Client()
+client.on_connect = lambda *_: client.subscribe(c.TOPIC, c.QOS)
+client.on_messages = on_messages
+client.connect_async(c.HOST, c.PORT)
+client.loop_forever()
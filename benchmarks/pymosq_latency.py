@@ -0,0 +1,27 @@
+import threading
+import time
+
+from pymosquitto import Mosquitto as Client
+
+from benchmarks import config as c
+from benchmarks.latency import Tracker
+
+tracker = Tracker("pymosq")
+done = threading.Event()
+
+
+def on_message(client, userdata, msg):
+    if tracker.on_payload(msg.payload, time.monotonic_ns()):
+        done.set()
+
+
+client = Client()
+client.on_connect = lambda *_: client.subscribe(c.TOPIC, c.QOS)
+client.on_message = on_message
+client.connect(c.HOST, c.PORT)
+client.loop_start()
+while not done.wait(0.5) and not tracker.idle():
+    pass
+client.disconnect()
+client.loop_stop(False)
+tracker.report()
@@ -19,7 +19,7 @@ def on_message(client, userdata, msg):
 
 
 count = 0
-client = Client(logger=logger)
+client = Client(logger=logger, message_view=c.MESSAGE_VIEW)
 client.on_connect = lambda *_: client.subscribe(c.TOPIC, c.QOS)
 client.on_message = on_message
 client.connect_async(c.HOST, c.PORT)
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from pymosquitto.aio import TrueAsyncMosquitto as Client
+
+from benchmarks import config as c
+from benchmarks.latency import Tracker
+
+kwargs = {"max_packets": c.MAX_PACKETS} if c.MAX_PACKETS else {}
+
+
+# ends reading with the end-of-stream marker when the end message never arrives
+async def watchdog(client, tracker):
+    while not tracker.idle():
+        await asyncio.sleep(0.5)
+    client.messages.put_nowait(None)
+
+
+async def main():
+    tracker = Tracker("pymosq_true_async")
+    async with Client(**kwargs) as client:
+        await client.connect(c.HOST, c.PORT)
+        await client.subscribe(c.TOPIC, c.QOS)
+        task = asyncio.create_task(watchdog(client, tracker))
+        # stamped when the application gets the message, so queueing counts
+        async for msg in client.read_messages():
+            if tracker.on_payload(msg.payload, time.monotonic_ns()):
+                break
+        task.cancel()
+    tracker.report()
+
+
+if c.UVLOOP:
+    import uvloop
+
+    uvloop.run(main())
+else:
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+import asyncio
+
+from pymosquitto.aio import TrueAsyncMosquitto as Client
+
+from benchmarks import config as c
+
+
+kwargs = {"max_packets": c.MAX_PACKETS} if c.MAX_PACKETS else {}
+
+
+async def main():
+    done = asyncio.get_running_loop().create_future()
+    count = 0
+
+    def on_published(_):
+        nonlocal count
+        count += 1
+        if count == c.LIMIT:
+            done.set_result(None)
+
+    async with Client(max_inflight=c.PUB_WINDOW, **kwargs) as client:
+        await client.connect(c.HOST, c.PORT)
+        for i in range(c.LIMIT):
+            fut = await client.publish_pipelined(
+                c.TOPICS[i % c.PUB_TOPICS], c.PAYLOAD, c.QOS
+            )
+            fut.add_done_callback(on_published)
+        await done
+        print("DONE")
+
+
+if c.UVLOOP:
+    import uvloop
+
+    uvloop.run(main())
+else:
+    asyncio.run(main())
@@ -13,9 +13,12 @@ if c.INTERVAL:
     logger = logging.getLogger()
 
 
+kwargs = {"max_packets": c.MAX_PACKETS} if c.MAX_PACKETS else {}
+
+
 async def main():
     count = 0
-    async with Client(logger=logger) as client:
+    async with Client(logger=logger, **kwargs) as client:
         await client.connect(c.HOST, c.PORT)
         await client.subscribe(c.TOPIC, c.QOS)
         async for _ in client.read_messages():
@@ -25,4 +28,9 @@ async def main():
                 break
 
 
-asyncio.run(main())
+if c.UVLOOP:
+    import uvloop
+
+    uvloop.run(main())
+else:
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+import random
+import time
+import typing as t
+
+from pymosquitto import helpers as h
+
+
+# the previous implementation: one libmosquitto call per registered filter
+class LinearTopicMatcher:
+    def __init__(self) -> None:
+        self._handlers: dict[str, t.Callable] = {}
+
+    def find(self, topic: str) -> t.Iterator[t.Callable]:
+        for sub, func in self._handlers.items():
+            if h.libmosq_topic_matches_sub(sub, topic):
+                yield func
+
+    def set_topic_callback(self, topic: str, callback: t.Callable) -> None:
+        self._handlers[topic] = callback
+
+
+def make_filters(count):
+    filters = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            filters.append(f"devices/{i}/telemetry")
+        elif kind == 1:
+            filters.append(f"devices/{i}/+")
+        elif kind == 2:
+            filters.append(f"devices/{i}/#")
+        else:
+            filters.append(f"+/{i}/status")
+    return filters
+
+
+def make_topics(count, amount=1000):
+    rnd = random.Random(count)
+    return [
+        f"devices/{rnd.randrange(count)}/{rnd.choice(('telemetry', 'status'))}"
+        for _ in range(amount)
+    ]
+
+
+def bench(matcher, topics, lookups):
+    started = time.perf_counter()
+    for i in range(lookups):
+        for _ in matcher.find(topics[i % len(topics)]):
+            pass
+    return (time.perf_counter() - started) / lookups * 1e6
+
+
+def main():
+    print("Filters;Matcher;us/lookup")
+    for count in (10, 1_000, 100_000):
+        filters = make_filters(count)
+        topics = make_topics(count)
+        matchers = {
+            "linear": LinearTopicMatcher(),
+            "trie": h.TopicMatcher(cache_size=0),
+            "trie+cache": h.TopicMatcher(),
+        }
+        for matcher in matchers.values():
+            for sub in filters:
+                matcher.set_topic_callback(sub, print)
+        for name, matcher in matchers.items():
+            lookups = max(20, 1_000_000 // count) if name == "linear" else 100_000
+            print(f"{count};{name};{bench(matcher, topics, lookups):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import csv
+import os
 import sys
 from datetime import datetime
 
@@ -65,8 +66,78 @@ def plot_results(results: dict, outfile: str):
     plt.close()
 
 
+def parse_pub_csv(path: str) -> list:
+    result = []
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f, delimiter=";")
+        for row in reader:
+            result.append(
+                {
+                    "Module": row["Module"].strip(),
+                    "QoS": int(row["QoS"]),
+                    "Payload": int(row["Payload"]),
+                    "Topics": int(row["Topics"]),
+                    "Msgs/s": float(row["Msgs/s"]),
+                    "CPU s/M": float(row["CPU s/M"]),
+                    "RSS (MB)": max(0, int(row["RSS"]) - PYTHON_RSS) / 1024,
+                }
+            )
+    return result
+
+
+# one subplot per QoS and topic count, payload size on the x axis, a line per module
+def plot_matrix(rows: list, metric: str, outfile: str, logy: bool = False):
+    qos_levels = sorted({r["QoS"] for r in rows})
+    topic_counts = sorted({r["Topics"] for r in rows})
+    modules = list(dict.fromkeys(r["Module"] for r in rows))
+
+    fig, axes = plt.subplots(
+        len(qos_levels),
+        len(topic_counts),
+        figsize=(4 * len(topic_counts), 3 * len(qos_levels)),
+        squeeze=False,
+        sharex=True,
+    )
+    for row, qos in enumerate(qos_levels):
+        for col, topics in enumerate(topic_counts):
+            ax = axes[row][col]
+            ax.set_title(f"QoS {qos}, {topics} topic(s)", fontsize="small")
+            ax.set_xscale("log", base=2)
+            if logy:
+                ax.set_yscale("log")
+            for module in modules:
+                # failed runs are recorded as zeros
+                points = sorted(
+                    (r["Payload"], r[metric])
+                    for r in rows
+                    if r["Module"] == module
+                    and r["QoS"] == qos
+                    and r["Topics"] == topics
+                    and r[metric]
+                )
+                if points:
+                    ax.plot(*zip(*points), marker="o", label=module)
+            if row == len(qos_levels) - 1:
+                ax.set_xlabel("Payload (bytes)")
+            if col == 0:
+                ax.set_ylabel(metric)
+
+    handles, labels = axes[0][0].get_legend_handles_labels()
+    fig.legend(handles, labels, loc="upper center", ncol=len(modules))
+    fig.tight_layout(rect=(0, 0, 1, 0.95))
+    fig.savefig(outfile, dpi=150)
+    plt.close(fig)
+
+
 data = parse_csv("benchmark.csv")
 plot_results(data, "results.png")
 for module in LOSERS:
     del data[module]
 plot_results(data, "results_fast.png")
+
+if os.path.exists("benchmark_pub.csv"):
+    pub_data = parse_pub_csv("benchmark_pub.csv")
+    # rates drop by orders of magnitude from small to large payloads
+    plot_matrix(pub_data, "Msgs/s", "results_pub.png", logy=True)
+    plot_matrix(pub_data, "CPU s/M", "results_pub_cpu.png")
+    plot_matrix(pub_data, "RSS (MB)", "results_pub_rss.png")
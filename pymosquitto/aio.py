@@ -1,23 +1,174 @@
 import asyncio
+import ctypes as C
+import enum
+import errno
+import functools
+import socket
+import threading
+import time
+import warnings
 import weakref
-from collections import deque
+from collections import OrderedDict, deque
 import abc
 
-from pymosquitto.bindings import connack_string
-from pymosquitto.client import Mosquitto
+from pymosquitto.bindings import connack_string, strerror
+from pymosquitto.client import Mosquitto, MosquittoError
 from pymosquitto.constants import ConnackCode
 
+DNS_CACHE_TTL = 60
+DNS_CACHE_SIZE = 256
+
+# least recently used entries first
+_dns_cache: OrderedDict[tuple[str, int], tuple[float, list]] = OrderedDict()
+
+
+async def resolve_host(host, port, ttl=DNS_CACHE_TTL):
+    # all addresses of the host, in getaddrinfo order
+    key = (host, port)
+    entry = _dns_cache.get(key)
+    if entry and entry[0] > time.monotonic():
+        _dns_cache.move_to_end(key)
+        return entry[1]
+    loop = asyncio.get_running_loop()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    addrs = list(dict.fromkeys(info[4][0] for info in infos))
+    _dns_cache[key] = (time.monotonic() + ttl, addrs)
+    _dns_cache.move_to_end(key)
+    while len(_dns_cache) > DNS_CACHE_SIZE:
+        _dns_cache.popitem(last=False)
+    return addrs
+
+
+def _get_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.get_event_loop()
+
+
+class OverflowPolicy(enum.Enum):
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    # never drops, the client stops reading from the network while the queue is full
+    BLOCK = "block"
+    # keeps only the latest message per topic
+    CONFLATE = "conflate"
+
+
+class MessageQueue:
+    def __init__(self, maxsize=0, policy=OverflowPolicy.DROP_OLDEST, on_space=None):
+        self._maxsize = maxsize
+        self._policy = policy
+        self._conflate = policy == OverflowPolicy.CONFLATE
+        self._items = OrderedDict() if self._conflate else deque()
+        self._getters = deque()
+        self._on_space = on_space
+        self.dropped = 0
+        self.conflated = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @property
+    def policy(self):
+        return self._policy
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def full(self):
+        return 0 < self._maxsize <= len(self._items)
+
+    def put_nowait(self, msg):
+        items = self._items
+        if self._conflate:
+            # `None` marks the end of the stream, it's never dropped
+            topic = None if msg is None else msg.topic
+            if topic in items:
+                items[topic] = msg
+                self.conflated += 1
+                return
+            if msg is not None and self.full():
+                items.popitem(last=False)
+                self.dropped += 1
+            items[topic] = msg
+        else:
+            if msg is not None and self.full():
+                if self._policy == OverflowPolicy.DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self._policy == OverflowPolicy.DROP_OLDEST:
+                    items.popleft()
+                    self.dropped += 1
+            items.append(msg)
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                break
+
+    def get_nowait(self):
+        items = self._items
+        if not items:
+            raise asyncio.QueueEmpty
+        if self._conflate:
+            _, msg = items.popitem(last=False)
+        else:
+            msg = items.popleft()
+        if self._on_space is not None and len(items) == self._maxsize - 1:
+            self._on_space()
+        return msg
+
+    async def get(self):
+        while not self._items:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except asyncio.CancelledError:
+                if getter in self._getters:
+                    self._getters.remove(getter)
+                raise
+        return self.get_nowait()
+
 
 class BaseAsyncMosquitto(abc.ABC):
-    def __init__(self, *args, loop=None, **kwargs):
+    def __init__(
+        self,
+        *args,
+        loop=None,
+        max_inflight=20,
+        max_queued_messages=0,
+        overflow=OverflowPolicy.DROP_OLDEST,
+        **kwargs,
+    ):
         self._mosq = Mosquitto(*args, **kwargs)
-        self._loop = loop or asyncio.get_event_loop()
+        if self._mosq.message_view:
+            raise ValueError("message views are not supported by async clients")
+        self._loop = loop or _get_loop()
         self._conn_future = None
+        # the CONNACK or failure of the address being tried
+        self._attempt_future = None
+        self._more_addrs = False
         self._disconn_future = None
         self._pub_mids = weakref.WeakValueDictionary()
         self._sub_mids = weakref.WeakValueDictionary()
         self._unsub_mids = weakref.WeakValueDictionary()
-        self._messages = asyncio.Queue()
+        self._publishing = False
+        self._early_pub_mids = set()
+        # keeps the futures of pipelined messages alive until they release the window
+        self._inflight = set()
+        self._disconnects = 0
+        self._window = asyncio.Semaphore(max_inflight) if max_inflight else None
+        self._mosq.max_inflight_messages_set(max_inflight)
+        self._messages = MessageQueue(
+            max_queued_messages, overflow, on_space=self._resume_reading
+        )
+        self._block = overflow == OverflowPolicy.BLOCK and max_queued_messages > 0
         self._put_msg = self._messages.put_nowait
         self._get_msg = self._messages.get
         self._set_default_callbacks()
@@ -26,7 +177,10 @@ class BaseAsyncMosquitto(abc.ABC):
         return self
 
     async def __aexit__(self, *_):
-        await self.disconnect(strict=False)
+        try:
+            await self.disconnect(strict=False)
+        finally:
+            self._fail_inflight("client closed")
 
     @property
     def mosq(self):
@@ -40,6 +194,20 @@ class BaseAsyncMosquitto(abc.ABC):
     def messages(self):
         return self._messages
 
+    def stats(self):
+        stats = self._mosq.stats()
+        messages = self._messages
+        stats.update(
+            queue_depth=messages.qsize(),
+            queue_dropped=messages.dropped,
+            queue_conflated=messages.conflated,
+            # futures still waiting for their acknowledgement
+            pending_publishes=len(self._pub_mids),
+            pending_subscribes=len(self._sub_mids) + len(self._unsub_mids),
+            pipelined=len(self._inflight),
+        )
+        return stats
+
     def _set_default_callbacks(self):
         self._mosq.on_connect = self._on_connect
         self._mosq.on_disconnect = self._on_disconnect
@@ -49,15 +217,31 @@ class BaseAsyncMosquitto(abc.ABC):
         self._mosq.on_message = self._on_message
 
     def _on_connect(self, mosq, userdata, rc):
-        self._conn_future.set_result(rc)
+        fut = self._attempt_future
+        if fut is not None and not fut.done():
+            fut.set_result(rc)
 
     def _on_disconnect(self, mosq, userdata, rc):
+        fut = self._attempt_future
+        if fut is not None and not fut.done():
+            fut.set_exception(ConnectionError(strerror(rc)))
+            if self._more_addrs:
+                # connect goes on with the next address, the readers keep waiting
+                return
+        self._disconnects += 1
+        self._fail_inflight(strerror(rc))
         self._put_msg(None)
         if self._disconn_future:
             self._disconn_future.set_result(rc)
 
     def _on_publish(self, mosq, userdata, mid):
-        self._pub_mids[mid].set_result(mid)
+        fut = self._pub_mids.pop(mid, None)
+        if fut is not None:
+            if not fut.done():
+                fut.set_result(mid)
+        elif self._publishing:
+            # QoS 0 message written inside mosquitto_publish, before its future exists
+            self._early_pub_mids.add(mid)
 
     def _on_subscribe(self, mosq, userdata, mid, qos_count, granted_qos):
         self._sub_mids[mid].set_result(granted_qos)
@@ -66,18 +250,103 @@ class BaseAsyncMosquitto(abc.ABC):
         self._unsub_mids[mid].set_result(mid)
 
     def _on_message(self, mosq, userdata, msg):
-        self._put_msg(msg)
+        self._enqueue(msg)
 
-    async def connect(self, *args, **kwargs):
+    def _enqueue(self, msg):
+        self._put_msg(msg)
+        if self._block and self._messages.full():
+            self._pause_reading()
+
+    def _pause_reading(self):
+        pass
+
+    def _resume_reading(self):
+        pass
+
+    async def connect(
+        self,
+        host,
+        port=1883,
+        keepalive=60,
+        bind_address=None,
+        props=None,
+        timeout=None,
+        resolve=False,
+    ):
         if self._conn_future:
             return await self._conn_future
-        self._conn_future = self._loop.create_future()
-        self._mosq.connect(*args, **kwargs)
-        rc = await self._conn_future
-        self._conn_future = None
-        if rc != ConnackCode.ACCEPTED:
-            raise ConnectionError(connack_string(rc))
-        return rc
+        fut = self._conn_future = self._loop.create_future()
+        try:
+            rc = await asyncio.wait_for(
+                self._connect(host, port, keepalive, bind_address, props, resolve),
+                timeout,
+            )
+            fut.set_result(rc)
+            return rc
+        finally:
+            # concurrent callers waiting for this connect are released on failure
+            if not fut.done():
+                fut.cancel()
+            self._conn_future = None
+
+    async def _connect(self, host, port, keepalive, bind_address, props, resolve):
+        addrs = await resolve_host(host, port) if resolve else [host]
+        try:
+            for i, addr in enumerate(addrs):
+                self._more_addrs = i < len(addrs) - 1
+                try:
+                    rc = await self._connect_addr(
+                        addr, port, keepalive, bind_address, props, resolve
+                    )
+                except (MosquittoError, ConnectionError):
+                    # refused, unreachable or dropped before the CONNACK
+                    if not self._more_addrs:
+                        raise
+                    continue
+                if rc != ConnackCode.ACCEPTED:
+                    raise ConnectionError(connack_string(rc))
+                return rc
+        except asyncio.CancelledError:
+            # a timeout: the socket, if there is one, is handed to the loop to be closed
+            if self._mosq.socket() is not None:
+                self._watch_socket()
+                self._mosq.disconnect(strict=False)
+            raise
+        finally:
+            self._attempt_future = None
+            self._more_addrs = False
+
+    async def _connect_addr(self, addr, port, keepalive, bind_address, props, resolve):
+        fut = self._attempt_future = self._loop.create_future()
+        if props:
+            # libmosquitto has no asynchronous MQTT v5 connect
+            connect = functools.partial(
+                self._mosq.connect, addr, port, keepalive, bind_address, props
+            )
+        else:
+            connect = functools.partial(
+                self._mosq.connect_async, addr, port, keepalive, bind_address
+            )
+        if resolve and not props:
+            connect()
+        else:
+            # blocking calls, libmosquitto resolves the host or connects the socket itself
+            await self._run_blocking(connect)
+        self._watch_socket()
+        return await fut
+
+    async def _run_blocking(self, func):
+        done = self._loop.run_in_executor(None, func)
+        try:
+            return await asyncio.shield(done)
+        except asyncio.CancelledError:
+            # the call can't be interrupted, tearing down before it returns would
+            # leave the socket it connects unwatched
+            await asyncio.wait({done})
+            raise
+
+    def _watch_socket(self):
+        pass
 
     async def disconnect(self, strict=True):
         if self._disconn_future:
@@ -89,17 +358,83 @@ class BaseAsyncMosquitto(abc.ABC):
         return rc
 
     async def publish(self, *args, **kwargs):
-        mid = self._mosq.publish(*args, **kwargs)
-        await self._wait_future(self._pub_mids, mid)
-        return mid
+        return await self.publish_nowait(*args, **kwargs)
+
+    def publish_nowait(self, *args, ack=True, **kwargs):
+        if not ack:
+            mid = self._mosq.publish(*args, **kwargs)
+            self._wakeup_writer()
+            return mid
+        self._publishing = True
+        try:
+            mid = self._mosq.publish(*args, **kwargs)
+        finally:
+            self._publishing = False
+        self._wakeup_writer()
+        return self._pub_future(mid)
+
+    async def publish_pipelined(self, *args, ack=True, **kwargs):
+        if not ack or self._window is None:
+            return self.publish_nowait(*args, ack=ack, **kwargs)
+        disconnects = self._disconnects
+        await self._window.acquire()
+        if disconnects != self._disconnects:
+            # the slot was freed by failing the messages in flight
+            self._window.release()
+            raise ConnectionError("disconnected while waiting for the window")
+        try:
+            fut = self.publish_nowait(*args, **kwargs)
+        except BaseException:
+            self._window.release()
+            raise
+        self._inflight.add(fut)
+        fut.add_done_callback(self._release_window)
+        return fut
+
+    def _release_window(self, fut):
+        self._inflight.discard(fut)
+        if not fut.cancelled():
+            # fire-and-forget callers never look at a failed future
+            fut.exception()
+        self._window.release()
+
+    def _fail_inflight(self, reason):
+        # the window slots are released by the futures' done callbacks
+        for fut in list(self._inflight):
+            if not fut.done():
+                fut.set_exception(ConnectionError(reason))
+
+    async def publish_many(self, messages):
+        self._publishing = True
+        try:
+            mids = self._mosq.publish_many(messages)
+        finally:
+            self._publishing = False
+        self._wakeup_writer()
+        await asyncio.gather(*[self._pub_future(mid) for mid in mids])
+        return mids
+
+    def _pub_future(self, mid):
+        fut = self._loop.create_future()
+        if mid in self._early_pub_mids:
+            self._early_pub_mids.discard(mid)
+            fut.set_result(mid)
+        else:
+            self._pub_mids[mid] = fut
+        return fut
+
+    def _wakeup_writer(self):
+        pass
 
     async def subscribe(self, *args, **kwargs):
         mid = self._mosq.subscribe(*args, **kwargs)
+        self._wakeup_writer()
         await self._wait_future(self._sub_mids, mid)
         return mid
 
     async def unsubscribe(self, *args, **kwargs):
         mid = self._mosq.unsubscribe(*args, **kwargs)
+        self._wakeup_writer()
         await self._wait_future(self._unsub_mids, mid)
         return mid
 
@@ -117,30 +452,34 @@ class BaseAsyncMosquitto(abc.ABC):
 
 
 class AsyncMosquitto(BaseAsyncMosquitto):
-    def __init__(self, *args, buffer_size=2000, flush_interval=0.05, **kwargs):
+    def __init__(self, *args, buffer_size=None, flush_interval=None, **kwargs):
+        if buffer_size is not None or flush_interval is not None:
+            warnings.warn(
+                "buffer_size and flush_interval are ignored, messages are handed to "
+                "asyncio as soon as they arrive",
+                DeprecationWarning,
+                stacklevel=2,
+            )
         super().__init__(*args, **kwargs)
-        self._buffer_size = buffer_size
-        self._flush_interval = flush_interval
         self._buffer = deque()
-        self._buffer_full = asyncio.Event()
-        self._flush_task = None
+        self._drain_scheduled = False
+        self._not_full = threading.Event()
+        self._not_full.set()
 
     async def __aenter__(self):
         self._mosq.loop_start()
         return await super().__aenter__()
 
+    async def disconnect(self, strict=True):
+        # a network thread blocked on a full queue couldn't send DISCONNECT
+        self._not_full.set()
+        return await super().disconnect(strict=strict)
+
     def _on_connect(self, mosq, userdata, rc):
         self._loop.call_soon_threadsafe(super()._on_connect, mosq, userdata, rc)
-        if not self._flush_task:
-            self._flush_task = self._loop.call_soon_threadsafe(
-                self._loop.create_task, self._flush_messages()
-            )
 
     def _on_disconnect(self, mosq, userdata, rc):
         self._loop.call_soon_threadsafe(super()._on_disconnect, mosq, userdata, rc)
-        if self._flush_task:
-            self._flush_task.cancel()
-            self._flush_task = None
 
     def _on_publish(self, mosq, userdata, mid):
         self._loop.call_soon_threadsafe(super()._on_publish, mosq, userdata, mid)
@@ -154,91 +493,169 @@ class AsyncMosquitto(BaseAsyncMosquitto):
         self._loop.call_soon_threadsafe(super()._on_unsubscribe, mosq, userdata, mid)
 
     def _on_message(self, mosq, userdata, msg):
+        if self._block:
+            self._not_full.wait()
         self._buffer.append(msg)
-        if len(self._buffer) >= self._buffer_size:
-            self._loop.call_soon_threadsafe(self._buffer_full.set)
+        # at most one wakeup is pending, the drain picks up everything appended until then
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            self._loop.call_soon_threadsafe(self._drain_buffer)
 
-    async def _flush_messages(self):
-        try:
-            while True:
-                while self._buffer:
-                    msg = self._buffer.popleft()
-                    self._put_msg(msg)
-                # either wait for the buffer to fill up or timeout after flush_interval
-                task = self._loop.create_task(self._buffer_full.wait())
-                done, pending = await asyncio.wait({task}, timeout=self._flush_interval)
-                if done:
-                    self._buffer_full.clear()
-                else:
-                    task.cancel()
-        except asyncio.CancelledError:
-            pass
+    def _drain_buffer(self):
+        # reset the flag first, so a message appended during the drain schedules a new one
+        self._drain_scheduled = False
+        buffer = self._buffer
+        for _ in range(len(buffer)):
+            self._enqueue(buffer.popleft())
+
+    def stats(self):
+        stats = super().stats()
+        # received by the network thread, not yet handed to the queue
+        stats["buffered"] = len(self._buffer)
+        return stats
+
+    def _pause_reading(self):
+        self._not_full.clear()
+
+    def _resume_reading(self):
+        self._not_full.set()
+
+
+_WOULD_BLOCK = frozenset((errno.EAGAIN, errno.EWOULDBLOCK))
 
 
 class TrueAsyncMosquitto(BaseAsyncMosquitto):
-    MISC_SLEEP_TIME = 1
+    # libmosquitto keeps its keepalive timestamps in whole seconds
+    MISC_SLACK = 1
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, max_packets=64, read_budget=0.002, **kwargs):
         super().__init__(*args, **kwargs)
+        self._max_packets = max_packets
+        self._read_budget = read_budget
         self._fd = None
-        self._misc_task = None
+        self._misc_handle = None
+        self._reading = False
+        self._writing = False
+        self._connecting = False
+        self._last_read = 0.0
+        self._last_write = 0.0
 
     def _on_disconnect(self, mosq, userdata, rc):
-        fd = self._mosq.socket()
-        if fd:
-            self._loop.remove_reader(fd)
-            self._loop.remove_writer(fd)
-        if self._misc_task and not self._misc_task.done():
-            self._misc_task.cancel()
-            self._misc_task = None
+        if self._fd:
+            self._loop.remove_reader(self._fd)
+            self._loop.remove_writer(self._fd)
+        self._reading = False
+        self._writing = False
+        self._connecting = False
+        if self._misc_handle:
+            self._misc_handle.cancel()
+            self._misc_handle = None
         self._fd = None
         super()._on_disconnect(mosq, userdata, rc)
 
-    def _on_publish(self, mosq, userdata, mid):
-        super()._on_publish(mosq, userdata, mid)
-        self._check_writable()
-
-    def _on_subscribe(self, mosq, userdata, mid, qos_count, granted_qos):
-        super()._on_subscribe(mosq, userdata, mid, qos_count, granted_qos)
-        self._check_writable()
-
-    def _on_unsubscribe(self, mosq, userdata, mid):
-        super()._on_unsubscribe(mosq, userdata, mid)
-        self._check_writable()
+    def _on_message(self, mosq, userdata, msg):
+        if msg.qos:
+            # the acknowledgement is written from within mosquitto_loop_read
+            self._last_write = self._loop.time()
+        super()._on_message(mosq, userdata, msg)
 
     async def connect(self, *args, **kwargs):
-        task = self._loop.create_task(super().connect(*args, **kwargs))
-        self._loop.call_later(0, self._add_reader)
-        rc = await task
-        self._misc_task = self._loop.create_task(self._misc_loop())
+        rc = await super().connect(*args, **kwargs)
+        if self._misc_handle is None:
+            self._schedule_misc()
         return rc
 
+    def _watch_socket(self):
+        self._connecting = True
+        self._last_read = self._last_write = self._loop.time()
+        self._add_reader()
+        self._check_writable()
+
     def _add_reader(self):
         self._fd = self._mosq.socket()
         if self._fd:
             self._loop.add_reader(self._fd, self._loop_read)
+            self._reading = True
         else:
             raise RuntimeError("No socket")
 
-    def _loop_read(self):
-        try:
-            self._mosq.loop_read(1)
-        except BlockingIOError:
-            pass
+    def _pause_reading(self):
+        if self._fd and self._reading:
+            self._loop.remove_reader(self._fd)
+            self._reading = False
 
-    async def _misc_loop(self):
-        while True:
-            try:
-                self._check_writable()
-                self._mosq.loop_misc()
-                await asyncio.sleep(self.MISC_SLEEP_TIME)
-            except asyncio.CancelledError:
+    def _resume_reading(self):
+        if self._fd and not self._reading:
+            self._loop.add_reader(self._fd, self._loop_read)
+            self._reading = True
+
+    # mosquitto_loop_read handles a single packet per call, so the socket is drained here
+    # until it would block, `max_packets` are read or the time budget is spent
+    def _loop_read(self):
+        loop_read = self._mosq.loop_read
+        deadline = time.monotonic() + self._read_budget
+        for _ in range(self._max_packets):
+            C.set_errno(0)
+            loop_read(1)
+            if (
+                C.get_errno() in _WOULD_BLOCK
+                or not self._reading
+                or time.monotonic() >= deadline
+            ):
                 break
+        self._last_read = self._loop.time()
+        # packets queued from callbacks aren't written right away
+        self._check_writable()
+
+    # libmosquitto doesn't expose its keepalive timestamps, so they are tracked here
+    # and mosquitto_loop_misc is only called once a PINGREQ is due
+    def _misc_deadline(self):
+        return (
+            min(self._last_read, self._last_write)
+            + self._mosq.keepalive
+            + self.MISC_SLACK
+        )
+
+    def _schedule_misc(self):
+        if self._mosq.keepalive and self._fd:
+            self._misc_handle = self._loop.call_at(
+                self._misc_deadline(), self._loop_misc
+            )
 
+    def _loop_misc(self):
+        self._misc_handle = None
+        now = self._loop.time()
+        # the deadline moves on with traffic, the timer is re-armed lazily
+        if now >= self._misc_deadline():
+            if now >= self._last_read + self._mosq.keepalive:
+                self._last_read = now
+            self._last_write = now
+            self._mosq.loop_misc()
+            self._check_writable()
+        self._schedule_misc()
+
+    def _wakeup_writer(self):
+        self._last_write = self._loop.time()
+        self._check_writable()
+
+    # the writer stays registered while libmosquitto has packets to write
     def _check_writable(self):
-        if self._fd and self._mosq.want_write():
+        if self._fd and not self._writing and self._mosq.want_write():
             self._loop.add_writer(self._fd, self._loop_write)
+            self._writing = True
 
     def _loop_write(self):
-        self._mosq.loop_write()
-        self._loop.remove_writer(self._fd)
+        if self._connecting:
+            self._connecting = False
+            # mosquitto_loop completes a non-blocking connect before writing
+            try:
+                self._mosq.loop(0, 1)
+            except MosquittoError:
+                # reported through on_disconnect
+                return
+        else:
+            self._mosq.loop_write(1)
+        self._last_write = self._loop.time()
+        if self._fd and not self._mosq.want_write():
+            self._loop.remove_writer(self._fd)
+            self._writing = False
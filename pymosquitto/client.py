@@ -1,11 +1,15 @@
 import ctypes as C
 import atexit
 import enum
+import functools
 from dataclasses import dataclass
 import typing as t
-import weakref
-import types
+import time
 import os
+import sys
+import threading
+import warnings
+import weakref
 
 from .constants import (
     LogLevel,
@@ -21,19 +25,14 @@ from .bindings import (
     MQTTMessageStruct,
     MQTT5PropertyStruct,
     strerror,
-    ON_CONNECT,
-    ON_CONNECT_WITH_FLAGS,
     ON_CONNECT_V5,
-    ON_DISCONNECT,
     ON_DISCONNECT_V5,
     ON_LOG,
     ON_UNSUBSCRIBE_V5,
     ON_UNSUBSCRIBE,
     ON_SUBSCRIBE_V5,
     ON_SUBSCRIBE,
-    ON_MESSAGE,
     ON_PUBLISH_V5,
-    ON_PUBLISH,
     ON_MESSAGE_V5,
 )
 
@@ -92,10 +91,10 @@ class PropertyFactory(enum.Enum):
     STRING = libmosq.mosquitto_property_add_string
     STRING_PAIR = libmosq.mosquitto_property_add_string_pair
 
-    def __call__(self, identifier: MQTT5PropertyID, *args: t.Any) -> C.c_void_p:
-        prop = C.c_void_p(None)
-        check_errno(self.value(C.byref(prop), identifier, *args))
-        return prop
+    def __call__(self, identifier: MQTT5PropertyID, *args: t.Any) -> "PropertyList":
+        props = PropertyList()
+        props._add(self.value, identifier, *args)
+        return props
 
 
 @dataclass(slots=True)
@@ -128,23 +127,295 @@ class MQTT5Property:
 
     @classmethod
     def from_struct(cls, obj: t.Any) -> t.Optional["MQTT5Property"]:
-        if not obj:
-            return None
-        cnt = t.cast(MQTT5PropertyStruct, obj.contents)
-        return cls(
-            next=cls.from_struct(cnt.next) if cnt.next else None,
-            value=MQTT5PropertyValue(
-                cnt.value.i8,
-                cnt.value.i16,
-                cnt.value.i32,
-                cnt.value.varint,
-                C.string_at(cnt.value.bin.v, cnt.value.bin.len),
-                C.string_at(cnt.value.s.v, cnt.value.s.len).decode(),
-            ),
-            name=C.string_at(cnt.name.v, cnt.name.len).decode(),
-            identifier=cnt.identifier,
-            client_generated=cnt.client_generated,
+        first = last = None
+        # iterative, a long property list must not hit the recursion limit
+        while obj:
+            cnt = t.cast(MQTT5PropertyStruct, obj.contents)
+            prop = cls(
+                next=None,
+                value=MQTT5PropertyValue(
+                    cnt.value.i8,
+                    cnt.value.i16,
+                    cnt.value.i32,
+                    cnt.value.varint,
+                    C.string_at(cnt.value.bin.v, cnt.value.bin.len),
+                    C.string_at(cnt.value.s.v, cnt.value.s.len).decode(),
+                ),
+                name=C.string_at(cnt.name.v, cnt.name.len).decode(),
+                identifier=cnt.identifier,
+                client_generated=cnt.client_generated,
+            )
+            if last is None:
+                first = prop
+            else:
+                last.next = prop
+            last = prop
+            obj = cnt.next
+        return first
+
+
+_ID = MQTT5PropertyID
+
+# the union member holding the value of each property
+_PROPERTY_TYPES = {
+    _ID.PAYLOAD_FORMAT_INDICATOR: "i8",
+    _ID.MESSAGE_EXPIRY_INTERVAL: "i32",
+    _ID.CONTENT_TYPE: "s",
+    _ID.RESPONSE_TOPIC: "s",
+    _ID.CORRELATION_DATA: "bin",
+    _ID.SUBSCRIPTION_IDENTIFIER: "varint",
+    _ID.SESSION_EXPIRY_INTERVAL: "i32",
+    _ID.ASSIGNED_CLIENT_IDENTIFIER: "s",
+    _ID.SERVER_KEEP_ALIVE: "i16",
+    _ID.AUTHENTICATION_METHOD: "s",
+    _ID.AUTHENTICATION_DATA: "bin",
+    _ID.REQUEST_PROBLEM_INFORMATION: "i8",
+    _ID.WILL_DELAY_INTERVAL: "i32",
+    _ID.REQUEST_RESPONSE_INFORMATION: "i8",
+    _ID.RESPONSE_INFORMATION: "s",
+    _ID.SERVER_REFERENCE: "s",
+    _ID.REASON_STRING: "s",
+    _ID.RECEIVE_MAXIMUM: "i16",
+    _ID.TOPIC_ALIAS_MAXIMUM: "i16",
+    _ID.TOPIC_ALIAS: "i16",
+    _ID.MAXIMUM_QOS: "i8",
+    _ID.RETAIN_AVAILABLE: "i8",
+    _ID.USER_PROPERTY: "pair",
+    _ID.MAXIMUM_PACKET_SIZE: "i32",
+    _ID.WILDCARD_SUB_AVAILABLE: "i8",
+    _ID.SUBSCRIPTION_ID_AVAILABLE: "i8",
+    _ID.SHARED_SUB_AVAILABLE: "i8",
+}
+
+del _ID
+
+
+def _property_value(cnt: MQTT5PropertyStruct) -> t.Any:
+    kind = _PROPERTY_TYPES.get(cnt.identifier, "i32")
+    value = cnt.value
+    if kind == "s":
+        return C.string_at(value.s.v, value.s.len).decode()
+    if kind == "pair":
+        return (
+            C.string_at(cnt.name.v, cnt.name.len).decode(),
+            C.string_at(value.s.v, value.s.len).decode(),
         )
+    if kind == "bin":
+        return C.string_at(value.bin.v, value.bin.len)
+    return getattr(value, kind)
+
+
+class Properties:
+    # decodes only the accessed properties, valid for the duration of the callback,
+    # call `detach()` to keep them
+    __slots__ = ("_ptr", "_nodes", "_order", "_values", "_released")
+
+    def __init__(self, obj: t.Any) -> None:
+        self._ptr = obj if obj else None
+        self._nodes: t.Optional[dict[int, list[MQTT5PropertyStruct]]] = None
+        self._order: list[int] = []
+        self._values: dict[int, list[t.Any]] = {}
+        self._released = False
+
+    def _index(self) -> dict[int, list[MQTT5PropertyStruct]]:
+        if self._nodes is None:
+            if self._released:
+                raise ValueError("properties are released, use `detach()` to keep them")
+            nodes: dict[int, list[MQTT5PropertyStruct]] = {}
+            order = self._order
+            ptr = self._ptr
+            while ptr:
+                cnt = ptr.contents
+                order.append(cnt.identifier)
+                nodes.setdefault(cnt.identifier, []).append(cnt)
+                ptr = cnt.next
+            self._nodes = nodes
+        return self._nodes
+
+    def getall(self, identifier: MQTT5PropertyID) -> list[t.Any]:
+        values = self._values.get(identifier)
+        if values is None:
+            nodes = self._index().get(identifier, ())
+            values = self._values[identifier] = [_property_value(n) for n in nodes]
+        return list(values)
+
+    def get(self, identifier: MQTT5PropertyID, default: t.Any = None) -> t.Any:
+        values = self._values.get(identifier)
+        if values is None:
+            values = self.getall(identifier)
+        return values[0] if values else default
+
+    def __getitem__(self, identifier: MQTT5PropertyID) -> t.Any:
+        values = self._values.get(identifier)
+        if values is None:
+            values = self.getall(identifier)
+        if not values:
+            raise KeyError(identifier)
+        return values[0]
+
+    def __contains__(self, identifier: object) -> bool:
+        return identifier in self._index()
+
+    def __iter__(self) -> t.Iterator[MQTT5PropertyID]:
+        self._index()
+        return iter([MQTT5PropertyID(i) for i in dict.fromkeys(self._order)])
+
+    # counts identifiers like `__iter__`, a repeated property counts once
+    def __len__(self) -> int:
+        return len(self._index())
+
+    def __bool__(self) -> bool:
+        if self._nodes is None and not self._released:
+            return self._ptr is not None
+        return bool(self._order)
+
+    def items(self) -> list[tuple[MQTT5PropertyID, t.Any]]:
+        self._index()
+        seen: dict[int, int] = {}
+        items = []
+        for identifier in self._order:
+            i = seen.get(identifier, 0)
+            seen[identifier] = i + 1
+            key = MQTT5PropertyID(identifier)
+            items.append((key, self.getall(key)[i]))
+        return items
+
+    @property
+    def user_properties(self) -> list[tuple[str, str]]:
+        return self.getall(MQTT5PropertyID.USER_PROPERTY)
+
+    # kept for compatibility, works on the native list only, so not after `detach()`
+    def find(self, identifier: MQTT5PropertyID) -> t.Optional[MQTT5Property]:
+        nodes = self._index().get(identifier)
+        if not nodes:
+            return None
+        return MQTT5Property.from_struct(C.pointer(nodes[0]))
+
+    def detach(self) -> "Properties":
+        props = Properties(None)
+        props._nodes = {}
+        for identifier in self._index():
+            props._nodes[identifier] = []
+            props._values[identifier] = self.getall(MQTT5PropertyID(identifier))
+        props._order = list(self._order)
+        return props
+
+    def release(self) -> None:
+        self._ptr = None
+        self._nodes = None
+        self._order = []
+        self._values = {}
+        self._released = True
+
+    def __repr__(self) -> str:
+        if self._released:
+            return f"{self.__class__.__name__}(released)"
+        return f"{self.__class__.__name__}({self.items()!r})"
+
+
+_PROPERTY_ADDERS = {
+    "i8": PropertyFactory.BYTE,
+    "i16": PropertyFactory.INT16,
+    "i32": PropertyFactory.INT32,
+    "varint": PropertyFactory.VARINT,
+    "bin": PropertyFactory.BIN,
+    "s": PropertyFactory.STRING,
+    "pair": PropertyFactory.STRING_PAIR,
+}
+
+PropertyItems = t.Union[
+    t.Mapping[MQTT5PropertyID, t.Any], t.Iterable[tuple[MQTT5PropertyID, t.Any]]
+]
+
+
+def _property_pairs(props: PropertyItems) -> list[tuple[MQTT5PropertyID, t.Any]]:
+    if isinstance(props, t.Mapping):
+        pairs: list[tuple[MQTT5PropertyID, t.Any]] = []
+        for identifier, value in props.items():
+            # a list holds the values of a repeated property, e.g. user properties
+            if isinstance(value, list):
+                pairs.extend((identifier, v) for v in value)
+            else:
+                pairs.append((identifier, value))
+        return pairs
+    return list(props)
+
+
+class PropertyList:
+    # owns a native property list, which is passed as is to the `props` arguments
+    __slots__ = ("_ptr", "_frozen")
+
+    def __init__(self, props: t.Optional[PropertyItems] = None) -> None:
+        self._ptr = C.c_void_p(None)
+        self._frozen = False
+        if props:
+            for identifier, value in _property_pairs(props):
+                self.add(identifier, value)
+
+    @property
+    def _as_parameter_(self) -> C.c_void_p:
+        return self._ptr
+
+    def add(self, identifier: MQTT5PropertyID, value: t.Any) -> "PropertyList":
+        kind = _PROPERTY_TYPES[identifier]
+        if kind == "pair":
+            name, value = value
+            args: tuple = (_encode(name), _encode(value))
+        elif kind == "s":
+            args = (_encode(value),)
+        elif kind == "bin":
+            args = (value, len(value))
+        else:
+            args = (value,)
+        self._add(_PROPERTY_ADDERS[kind].value, identifier, *args)
+        return self
+
+    def _add(self, func: t.Any, identifier: MQTT5PropertyID, *args: t.Any) -> None:
+        if self._frozen:
+            raise TypeError("cached property lists are immutable")
+        check_errno(func(C.byref(self._ptr), identifier, *args))
+
+    @classmethod
+    def cached(cls, props: PropertyItems) -> "PropertyList":
+        return _cached_property_list(tuple(_property_pairs(props)))
+
+    def close(self) -> None:
+        # a cached list is shared, it's freed once evicted from the cache and unused
+        if not self._frozen:
+            self._free()
+
+    def _free(self) -> None:
+        if self._ptr:
+            libmosq.mosquitto_property_free_all(C.byref(self._ptr))
+
+    def __del__(self) -> None:
+        self._free()
+
+    def __enter__(self) -> "PropertyList":
+        return self
+
+    def __exit__(self, *_: t.Any) -> None:
+        self.close()
+
+    def __bool__(self) -> bool:
+        return bool(self._ptr)
+
+    def __repr__(self) -> str:
+        ptr = C.cast(self._ptr, C.POINTER(MQTT5PropertyStruct))
+        return f"{self.__class__.__name__}({Properties(ptr).items()!r})"
+
+
+def _encode(value: t.Union[str, bytes]) -> bytes:
+    return value.encode() if isinstance(value, str) else value
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_property_list(
+    pairs: tuple[tuple[MQTT5PropertyID, t.Any], ...],
+) -> PropertyList:
+    props = PropertyList(pairs)
+    props._frozen = True
+    return props
 
 
 @dataclass(frozen=True, slots=True)
@@ -167,27 +438,163 @@ class MQTTMessage:
         )
 
 
-class Method:
-    def __init__(self, restype, func, *argtypes, **kwargs):
-        self._func = bind(restype, func, *argtypes)
-        self._kwargs = kwargs
+class MQTTMessageView:
+    # valid only for the duration of the callback, call `detach()` to keep the message
+    __slots__ = ("_cnt", "_topic", "_payload", "_buf")
 
-    def __get__(self, obj, objtype=None):
-        method_name = self._func.__name__
+    def __init__(self, obj: t.Any) -> None:
+        self._cnt: t.Optional[MQTTMessageStruct] = t.cast(
+            MQTTMessageStruct, obj.contents
+        )
+        self._topic: t.Optional[str] = None
+        self._payload: t.Optional[memoryview] = None
+        self._buf: t.Any = None
+
+    def _contents(self) -> MQTTMessageStruct:
+        if self._cnt is None:
+            raise ValueError(
+                "message view is released, use `detach()` to keep the message"
+            )
+        return self._cnt
+
+    @property
+    def mid(self) -> int:
+        return self._contents().mid
+
+    @property
+    def topic(self) -> str:
+        if self._topic is None:
+            self._topic = self._contents().topic.decode()
+        return self._topic
+
+    @property
+    def payload(self) -> memoryview:
+        if self._payload is None:
+            cnt = self._contents()
+            if cnt.payloadlen:
+                self._buf = (C.c_char * cnt.payloadlen).from_address(cnt.payload)
+                self._payload = memoryview(self._buf).cast("B")
+            else:
+                self._payload = memoryview(b"")
+        return self._payload
+
+    @property
+    def qos(self) -> int:
+        return self._contents().qos
+
+    @property
+    def retain(self) -> bool:
+        return self._contents().retain
+
+    def detach(self) -> MQTTMessage:
+        cnt = self._contents()
+        return MQTTMessage(
+            mid=cnt.mid,
+            topic=self.topic,
+            payload=C.string_at(cnt.payload, cnt.payloadlen),
+            qos=cnt.qos,
+            retain=cnt.retain,
+        )
+
+    def release(self) -> None:
+        self._cnt = None
+        payload, buf = self._payload, self._buf
+        self._payload = self._buf = None
+        if payload is None:
+            return
+        try:
+            payload.release()
+            # slices share the buffer without blocking the release, but keep the
+            # ctypes array alive; the references here are `buf` and the call argument
+            leaked = buf is not None and sys.getrefcount(buf) > 2
+        except BufferError:
+            # something like `np.frombuffer(msg.payload)` holds the view itself
+            leaked = True
+        if leaked:
+            # it points into memory libmosquitto frees as soon as the callback returns
+            warnings.warn(
+                "a view derived from the message payload outlived the callback, "
+                "copy the data with `bytes()` or use `detach()`",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+    def __repr__(self) -> str:
+        if self._cnt is None:
+            return f"{self.__class__.__name__}(released)"
+        return (
+            f"{self.__class__.__name__}(mid={self.mid}, topic={self.topic!r}, "
+            f"payloadlen={self._cnt.payloadlen}, qos={self.qos}, retain={self.retain})"
+        )
 
-        if not hasattr(obj, method_name):
 
-            def method(self_, *args):
-                return self_.call(self._func, self_.ptr, *args, **self._kwargs)
+class Method:
+    def __init__(
+        self, restype, func, *argtypes, check=True, auto_encode=True, auto_decode=True
+    ):
+        self._func = bind(restype, func, *argtypes)
+        self._check = check and restype == C.c_int
+        self._decode = auto_decode and restype == C.c_char_p
+        # positions of string arguments, not counting the leading client pointer
+        self._encode = (
+            tuple(i - 1 for i, arg in enumerate(argtypes) if i and arg == C.c_char_p)
+            if auto_encode
+            else ()
+        )
+        self._name = self._func.__name__
 
-            setattr(obj, method_name, types.MethodType(method, weakref.proxy(obj)))
+    def __set_name__(self, owner, name):
+        self._name = name
 
-        return getattr(obj, method_name)
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        method = self.compile(obj.ptr, obj.logger)
+        # the instance attribute shadows this (non-data) descriptor from now on
+        setattr(obj, self._name, method)
+        return method
+
+    def compile(self, ptr, logger=None):
+        func = self._func
+        check = self._check
+        decode = self._decode
+        encode = self._encode
+
+        if not (logger or decode or encode):
+            if not check:
+                return functools.partial(func, ptr)
+
+            def checked_method(*args):
+                ret = func(ptr, *args)
+                if ret:
+                    raise MosquittoError(ret)
+                return ret
+
+            return checked_method
+
+        def method(*args):
+            # logs the arguments as given, like `Mosquitto.call`
+            if logger:
+                logger.debug("CALL: %s%s", func.__name__, (ptr, *args))
+            if encode:
+                args = list(args)
+                for i in encode:
+                    if i < len(args) and isinstance(args[i], str):
+                        args[i] = args[i].encode()
+            ret = func(ptr, *args)
+            if check and ret:
+                raise MosquittoError(ret)
+            if decode and ret is not None:
+                ret = ret.decode()
+            return ret
+
+        return method
 
 
 class Callback:
-    def __init__(self, setter, decorator, wrapper):
-        self._setter = bind(None, setter, C.c_void_p, decorator)
+    # without a setter the callback is only stored, an event wrapper dispatches it
+    def __init__(self, setter=None, decorator=None, wrapper=None):
+        self._setter = setter and bind(None, setter, C.c_void_p, decorator)
         self._decorator = decorator
         self._wrapper = wrapper
         self._wrapped_callback = None
@@ -197,91 +604,374 @@ class Callback:
 
     def __set__(self, obj, callback):
         setattr(obj, self._attr_name, callback)
-        if callback and not self._wrapped_callback:
+        if self._setter is None:
+            return
+        # the thunk is shared by all the clients, so it's kept when one unsets it
+        if not self._wrapped_callback:
             self._wrapped_callback = self._decorator(self._wrapper)
-        elif not callback:
-            self._wrapped_callback = self._decorator(0)
-        obj.call(self._setter, obj.ptr, self._wrapped_callback)
+        wrapped = self._wrapped_callback if callback else self._decorator(0)
+        obj.call(self._setter, obj.ptr, wrapped)
 
     def __get__(self, obj, objtype=None):
-        return getattr(obj, self._attr_name)
+        return getattr(obj, self._attr_name, None)
+
+
+_CALLBACK_NAMES = (
+    "connect",
+    "disconnect",
+    "publish",
+    "message",
+    "messages",
+    "subscribe",
+    "unsubscribe",
+    "log",
+)
 
 
-def _connect_callback_wrapper(_, userdata, rc):
-    client = t.cast(Mosquitto, userdata)
-    if client and client.on_connect:
-        client.on_connect(client, client.userdata(), ConnackCode(rc))
+class ClientStats:
+    # plain counters bumped in place, the per-QoS lists are indexed by QoS;
+    # updates aren't locked, so counts from racing threads are approximate
+    __slots__ = (
+        "messages_in",
+        "bytes_in",
+        "messages_out",
+        "bytes_out",
+        "publish_acks",
+        "connects",
+        "disconnects",
+        "callbacks",
+        "callback_ns",
+    )
 
+    def __init__(self) -> None:
+        self.messages_in = [0, 0, 0]
+        self.bytes_in = [0, 0, 0]
+        self.messages_out = [0, 0, 0]
+        self.bytes_out = [0, 0, 0]
+        self.publish_acks = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.callbacks = dict.fromkeys(_CALLBACK_NAMES, 0)
+        # time spent in user callbacks
+        self.callback_ns = 0
 
-def _connect_with_flags_callback_wrapper(_, userdata, rc, flags):
-    client = t.cast(Mosquitto, userdata)
-    if client and client.on_connect_with_flags:
-        client.on_connect_with_flags(client, client.userdata(), ConnackCode(rc), flags)
+    def snapshot(self) -> dict[str, t.Any]:
+        return {
+            "messages_in": list(self.messages_in),
+            "bytes_in": list(self.bytes_in),
+            "messages_out": list(self.messages_out),
+            "bytes_out": list(self.bytes_out),
+            "publish_acks": self.publish_acks,
+            "connects": self.connects,
+            "reconnects": max(0, self.connects - 1),
+            "disconnects": self.disconnects,
+            "callbacks": dict(self.callbacks),
+            "callback_time": self.callback_ns / 1e9,
+        }
 
 
-def _connect_v5_callback_wrapper(_, userdata, rc, flags, prop):
-    client = t.cast(Mosquitto, userdata)
-    if client and client.on_connect_v5:
-        client.on_connect_v5(
-            client,
-            client.userdata(),
-            ConnackCode(rc),
-            flags,
-            MQTT5Property.from_struct(prop),
-        )
+# the rarely called wrappers go through this, the message and publish ones inline it
+def _run_callback(client, name, callback, *args):
+    stats = client._stats
+    stats.callbacks[name] += 1
+    started = time.perf_counter_ns()
+    try:
+        callback(client, client.userdata(), *args)
+    finally:
+        stats.callback_ns += time.perf_counter_ns() - started
 
 
-def _disconnect_callback_wrapper(_, userdata, rc):
-    client = t.cast(Mosquitto, userdata)
-    if client and client.on_disconnect:
-        client.on_disconnect(client, client.userdata(), ConnackCode(rc))
+# argument converters for the sampled path, see `profiler.CallbackProfiler.run`
+def _args(*args):
+    return args
 
 
-def _disconnect_v5_callback_wrapper(_, userdata, rc, prop):
-    client = t.cast(Mosquitto, userdata)
-    if client and client.on_disconnect_v5:
-        client.on_disconnect_v5(
-            client, client.userdata(), ConnackCode(rc), MQTT5Property.from_struct(prop)
-        )
+def _props_args(*args):
+    return (*args[:-1], Properties(args[-1]))
+
 
+def _connack_args(rc, *args):
+    return (ConnackCode(rc), *args)
 
-def _publish_callback_wrapper(_, userdata, mid):
+
+def _connack_props_args(rc, *args):
+    return (ConnackCode(rc), *args[:-1], Properties(args[-1]))
+
+
+def _granted_args(mid, count, granted_qos, *prop):
+    granted = [granted_qos[i] for i in range(count)]
+    return (mid, count, granted, *map(Properties, prop))
+
+
+def _log_args(level, msg):
+    return (LogLevel(level), msg.decode())
+
+
+# connect, disconnect, publish and message are dispatched by one always registered
+# v5 wrapper per event, libmosquitto calls it with every protocol version, so the
+# stats count each event once whichever callbacks are set
+
+
+def _connect_event(_, userdata, rc, flags, prop):
     client = t.cast(Mosquitto, userdata)
-    if client and client.on_publish:
-        client.on_publish(client, client.userdata(), mid)
+    if not client:
+        return
+    if rc == ConnackCode.ACCEPTED:
+        client._stats.connects += 1
+    profiler = client._profiler
+    if client.on_connect:
+        if profiler is not None and profiler.sample():
+            profiler.run(client, "connect", client.on_connect, _connack_args, rc)
+        else:
+            _run_callback(client, "connect", client.on_connect, ConnackCode(rc))
+    if client.on_connect_with_flags:
+        if profiler is not None and profiler.sample():
+            profiler.run(
+                client,
+                "connect",
+                client.on_connect_with_flags,
+                _connack_args,
+                rc,
+                flags,
+            )
+        else:
+            _run_callback(
+                client, "connect", client.on_connect_with_flags, ConnackCode(rc), flags
+            )
+    if client.on_connect_v5:
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client,
+                "connect",
+                client.on_connect_v5,
+                _connack_props_args,
+                rc,
+                flags,
+                prop,
+            )
+        props = Properties(prop)
+        try:
+            _run_callback(
+                client, "connect", client.on_connect_v5, ConnackCode(rc), flags, props
+            )
+        finally:
+            props.release()
 
 
-def _publish_v5_callback_wrapper(_, userdata, mid, prop):
+def _disconnect_event(_, userdata, rc, prop):
     client = t.cast(Mosquitto, userdata)
-    if client and client.on_publish_v5:
-        client.on_publish_v5(
-            client, client.userdata(), mid, MQTT5Property.from_struct(prop)
-        )
+    if not client:
+        return
+    client._stats.disconnects += 1
+    profiler = client._profiler
+    if client.on_disconnect:
+        if profiler is not None and profiler.sample():
+            profiler.run(client, "disconnect", client.on_disconnect, _connack_args, rc)
+        else:
+            _run_callback(client, "disconnect", client.on_disconnect, ConnackCode(rc))
+    if client.on_disconnect_v5:
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client,
+                "disconnect",
+                client.on_disconnect_v5,
+                _connack_props_args,
+                rc,
+                prop,
+            )
+        props = Properties(prop)
+        try:
+            _run_callback(
+                client, "disconnect", client.on_disconnect_v5, ConnackCode(rc), props
+            )
+        finally:
+            props.release()
 
 
-def _message_callback_wrapper(_, userdata, msg):
+def _publish_event(_, userdata, mid, prop):
     client = t.cast(Mosquitto, userdata)
-    if client and client.on_message:
-        client.on_message(client, client.userdata(), MQTTMessage.from_struct(msg))
+    if not client:
+        return
+    stats = client._stats
+    stats.publish_acks += 1
+    on_publish = client.on_publish
+    on_publish_v5 = client.on_publish_v5
+    if not (on_publish or on_publish_v5):
+        return
+    profiler = client._profiler
+    if on_publish:
+        if profiler is not None and profiler.sample():
+            profiler.run(client, "publish", on_publish, _args, mid)
+        else:
+            stats.callbacks["publish"] += 1
+            started = time.perf_counter_ns()
+            try:
+                on_publish(client, client.userdata(), mid)
+            finally:
+                stats.callback_ns += time.perf_counter_ns() - started
+    if on_publish_v5:
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client, "publish", on_publish_v5, _props_args, mid, prop
+            )
+        stats.callbacks["publish"] += 1
+        props = Properties(prop)
+        started = time.perf_counter_ns()
+        try:
+            on_publish_v5(client, client.userdata(), mid, props)
+        finally:
+            stats.callback_ns += time.perf_counter_ns() - started
+            props.release()
 
 
-def _message_v5_callback_wrapper(_, userdata, msg, prop):
+def _message_event(_, userdata, msg, prop):
     client = t.cast(Mosquitto, userdata)
-    if client and client.on_message_v5:
-        client.on_message_v5(
-            client,
-            client.userdata(),
-            MQTTMessage.from_struct(msg),
-            MQTT5Property.from_struct(prop),
-        )
+    if not client:
+        return
+    on_message = client.on_message
+    on_message_v5 = client.on_message_v5
+    if not (on_message or on_message_v5):
+        stats = client._stats
+        cnt = msg.contents
+        stats.messages_in[cnt.qos] += 1
+        stats.bytes_in[cnt.qos] += cnt.payloadlen
+        return
+    profiler = client._profiler
+    if profiler is not None and profiler.sample():
+        return profiler.run_message(client, msg, prop)
+    _dispatch_message(client, msg, prop, on_message, on_message_v5)
+
+
+# converts, counts and dispatches a message; `marks` collects the timestamps at the
+# end of the conversion, the callbacks and the release for the profiler
+def _dispatch_message(client, msg, prop, on_message, on_message_v5, marks=None):
+    stats = client._stats
+    stats.callbacks["message"] += bool(on_message) + bool(on_message_v5)
+    props = Properties(prop) if on_message_v5 else None
+    message: t.Union[MQTTMessage, MQTTMessageView]
+    if client.message_view:
+        message = MQTTMessageView(msg)
+        cnt = message._cnt
+        qos, size = cnt.qos, cnt.payloadlen
+    else:
+        message = MQTTMessage.from_struct(msg)
+        qos, size = message.qos, len(message.payload)
+    stats.messages_in[qos] += 1
+    stats.bytes_in[qos] += size
+    started = time.perf_counter_ns()
+    if marks is not None:
+        marks.append(started)
+    try:
+        if on_message:
+            on_message(client, client.userdata(), message)
+        if on_message_v5:
+            on_message_v5(client, client.userdata(), message, props)
+    finally:
+        handled = time.perf_counter_ns()
+        stats.callback_ns += handled - started
+        if client.message_view:
+            message.release()
+        if props is not None:
+            props.release()
+        if marks is not None:
+            marks.append(handled)
+            marks.append(time.perf_counter_ns())
+
+
+# event name: (callback setter, the thunk it's registered with)
+_EVENTS = {
+    "connect": (
+        bind(
+            None, libmosq.mosquitto_connect_v5_callback_set, C.c_void_p, ON_CONNECT_V5
+        ),
+        ON_CONNECT_V5(_connect_event),
+    ),
+    "disconnect": (
+        bind(
+            None,
+            libmosq.mosquitto_disconnect_v5_callback_set,
+            C.c_void_p,
+            ON_DISCONNECT_V5,
+        ),
+        ON_DISCONNECT_V5(_disconnect_event),
+    ),
+    "publish": (
+        bind(
+            None, libmosq.mosquitto_publish_v5_callback_set, C.c_void_p, ON_PUBLISH_V5
+        ),
+        ON_PUBLISH_V5(_publish_event),
+    ),
+    "message": (
+        bind(
+            None, libmosq.mosquitto_message_v5_callback_set, C.c_void_p, ON_MESSAGE_V5
+        ),
+        ON_MESSAGE_V5(_message_event),
+    ),
+}
+
+
+# delivers the batches whose latency expired when the client isn't driven by
+# loop_forever; the client is only referenced weakly while waiting, and an idle
+# flusher wakes up now and then to notice a collected client
+def _run_batch_flusher(ref, cond):
+    me = threading.current_thread()
+    while True:
+        with cond:
+            client = ref()
+            if client is None or client._flusher is not me:
+                return
+            remaining = client._batch_deadline - time.monotonic()
+            pending = bool(client._batch)
+            del client
+            if not pending:
+                cond.wait(1.0)
+                continue
+            if remaining > 0:
+                cond.wait(remaining)
+                continue
+        client = ref()
+        if client is None:
+            return
+        client.flush_messages()
+        del client
+
+
+def _batch_message_callback(client, userdata, msg):
+    if client.message_view:
+        msg = msg.detach()
+    with client._batch_cond:
+        batch = client._batch
+        if not batch:
+            client._batch_deadline = time.monotonic() + client._batch_latency
+            # loop_forever flushes between loop passes, any other loop needs the flusher
+            if not client._batch_looping:
+                if client._flusher is None:
+                    client._start_flusher()
+                client._batch_cond.notify()
+        batch.append(msg)
+        full = len(batch) >= client._batch_size
+    if full:
+        client.flush_messages()
 
 
 def _subscribe_callback_wrapper(_, userdata, mid, count, granted_qos):
     client = t.cast(Mosquitto, userdata)
     if client and client.on_subscribe:
-        client.on_subscribe(
+        profiler = client._profiler
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client,
+                "subscribe",
+                client.on_subscribe,
+                _granted_args,
+                mid,
+                count,
+                granted_qos,
+            )
+        _run_callback(
             client,
-            client.userdata(),
+            "subscribe",
+            client.on_subscribe,
             mid,
             count,
             [granted_qos[i] for i in range(count)],
@@ -291,38 +981,154 @@ def _subscribe_callback_wrapper(_, userdata, mid, count, granted_qos):
 def _subscribe_v5_callback_wrapper(_, userdata, mid, count, granted_qos, prop):
     client = t.cast(Mosquitto, userdata)
     if client and client.on_subscribe_v5:
-        client.on_subscribe_v5(
-            client,
-            client.userdata(),
-            mid,
-            count,
-            [granted_qos[i] for i in range(count)],
-            MQTT5Property.from_struct(prop),
-        )
+        profiler = client._profiler
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client,
+                "subscribe",
+                client.on_subscribe_v5,
+                _granted_args,
+                mid,
+                count,
+                granted_qos,
+                prop,
+            )
+        props = Properties(prop)
+        try:
+            _run_callback(
+                client,
+                "subscribe",
+                client.on_subscribe_v5,
+                mid,
+                count,
+                [granted_qos[i] for i in range(count)],
+                props,
+            )
+        finally:
+            props.release()
 
 
 def _unsubscribe_callback_wrapper(_, userdata, mid):
     client = t.cast(Mosquitto, userdata)
     if client and client.on_unsubscribe:
-        client.on_unsubscribe(client, client.userdata(), mid)
+        profiler = client._profiler
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client, "unsubscribe", client.on_unsubscribe, _args, mid
+            )
+        _run_callback(client, "unsubscribe", client.on_unsubscribe, mid)
 
 
 def _unsubscribe_v5_callback_wrapper(_, userdata, mid, prop):
     client = t.cast(Mosquitto, userdata)
     if client and client.on_unsubscribe_v5:
-        client.on_unsubscribe_v5(
-            client, client.userdata(), mid, MQTT5Property.from_struct(prop)
-        )
+        profiler = client._profiler
+        if profiler is not None and profiler.sample():
+            return profiler.run(
+                client, "unsubscribe", client.on_unsubscribe_v5, _props_args, mid, prop
+            )
+        props = Properties(prop)
+        try:
+            _run_callback(client, "unsubscribe", client.on_unsubscribe_v5, mid, props)
+        finally:
+            props.release()
 
 
 def _log_callback_wrapper(_, userdata, level, msg):
     client = t.cast(Mosquitto, userdata)
     if client and client.on_log:
-        client.on_log(client, client.userdata(), LogLevel(level), msg.decode())
+        profiler = client._profiler
+        if profiler is not None and profiler.sample():
+            return profiler.run(client, "log", client.on_log, _log_args, level, msg)
+        _run_callback(client, "log", client.on_log, LogLevel(level), msg.decode())
     elif client and client.logger:
         client.logger.debug("MOSQ/%s %s", LogLevel(level).name, msg.decode())
 
 
+def _payload_ref(payload):
+    if isinstance(payload, bytes):
+        return len(payload), payload
+    if isinstance(payload, str):
+        payload = payload.encode()
+        return len(payload), payload
+    view = memoryview(payload)
+    if not view.c_contiguous:
+        raise ValueError("payload must be a C-contiguous buffer")
+    if not view.nbytes:
+        return 0, None
+    if view.readonly:
+        # ctypes can take the address of writable buffers only
+        return view.nbytes, view.tobytes()
+    return view.nbytes, C.byref(C.c_char.from_buffer(view))
+
+
+class PublishHandle:
+    # reuses the encoded topic and the mid buffer, so it's not thread-safe
+    __slots__ = (
+        "_client",
+        "_publish",
+        "_mid",
+        "_mid_ref",
+        "_topic",
+        "_qos",
+        "_retain",
+        "_props",
+        "_stats",
+    )
+
+    def __init__(self, client, topic, qos=0, retain=False, props=None):
+        self._client = client
+        self._stats = client._stats
+        self._mid = C.c_int(0)
+        self._mid_ref = C.byref(self._mid)
+        self._topic = topic.encode()
+        self._qos = qos
+        self._retain = retain
+        self._props = (props,) if props else ()
+        self._publish = client._publish_v5 if props else client._publish
+
+    @property
+    def topic(self):
+        return self._topic.decode()
+
+    def send(self, payload):
+        if payload.__class__ is bytes:
+            payloadlen = len(payload)
+        else:
+            payloadlen, payload = _payload_ref(payload)
+        self._publish(
+            self._mid_ref,
+            self._topic,
+            payloadlen,
+            payload,
+            self._qos,
+            self._retain,
+            *self._props,
+        )
+        stats = self._stats
+        stats.messages_out[self._qos] += 1
+        stats.bytes_out[self._qos] += payloadlen
+        return self._mid.value
+
+
+_LOOP_FATAL_ERRORS = frozenset(
+    (
+        ErrorCode.NOMEM,
+        ErrorCode.PROTOCOL,
+        ErrorCode.INVAL,
+        ErrorCode.NOT_FOUND,
+        ErrorCode.TLS,
+        ErrorCode.PAYLOAD_SIZE,
+        ErrorCode.NOT_SUPPORTED,
+        ErrorCode.AUTH,
+        ErrorCode.ACL_DENIED,
+        ErrorCode.UNKNOWN,
+        ErrorCode.EAI,
+        ErrorCode.PROXY,
+    )
+)
+
+
 class Mosquitto:
     def __init__(
         self,
@@ -331,11 +1137,32 @@ class Mosquitto:
         userdata=None,
         logger=None,
         protocol=None,
+        message_view=False,
+        batch_size=1000,
+        batch_latency=0.05,
     ):
         if client_id is not None:
             client_id = client_id.encode()
         self._userdata = userdata
         self._logger = logger
+        self._message_view = message_view
+        self._on_messages = None
+        self._batch = []
+        self._batch_size = batch_size
+        self._batch_latency = batch_latency
+        self._batch_deadline = 0.0
+        self._batch_cond = threading.Condition(threading.Lock())
+        # held while a batch is handed over, so batches are delivered one at a time
+        self._deliver_lock = threading.RLock()
+        self._batch_looping = False
+        self._flusher = None
+        self._prev_on_message = None
+        self._reconnect_delay = (1, 1, False)
+        self._disconnecting = False
+        self._keepalive = 60
+        self._stats = ClientStats()
+        # set by `profiler.CallbackProfiler.attach`
+        self._profiler = None
         self._ptr = call(
             libmosq.mosquitto_new,
             client_id,
@@ -343,6 +1170,8 @@ class Mosquitto:
             self,
             use_errno=True,
         )
+        for setter, thunk in _EVENTS.values():
+            self.call(setter, self._ptr, thunk)
         if protocol is not None:
             self.int_option(Option.PROTOCOL_VERSION, protocol)
 
@@ -354,6 +1183,14 @@ class Mosquitto:
     def logger(self):
         return self._logger
 
+    @property
+    def message_view(self):
+        return self._message_view
+
+    @property
+    def keepalive(self):
+        return self._keepalive
+
     def __del__(self):
         self.destroy()
 
@@ -386,7 +1223,7 @@ class Mosquitto:
         C.c_bool,
     )
     # int mosquitto_will_set_v5(struct mosquitto *mosq, const char *topic, int payloadlen, const void *payload, int qos, bool retain, const mosquitto_property *props)
-    will_set_v5 = Method(
+    _will_set_v5 = Method(
         C.c_int,
         libmosq.mosquitto_will_set_v5,
         C.c_void_p,
@@ -397,6 +1234,19 @@ class Mosquitto:
         C.c_bool,
         C.c_void_p,
     )
+
+    def will_set_v5(self, topic, payloadlen, payload, qos, retain, props=None):
+        # libmosquitto takes ownership of the properties on success, so it gets a copy
+        # and the caller's list stays theirs to free
+        copy = C.c_void_p(None)
+        if props:
+            check_errno(libmosq.mosquitto_property_copy_all(C.byref(copy), props))
+        try:
+            return self._will_set_v5(topic, payloadlen, payload, qos, retain, copy)
+        except MosquittoError:
+            libmosq.mosquitto_property_free_all(C.byref(copy))
+            raise
+
     # int mosquitto_will_clear(struct mosquitto *mosq)
     will_clear = Method(C.c_int, libmosq.mosquitto_will_clear, C.c_void_p)
 
@@ -504,6 +1354,7 @@ class Mosquitto:
         C.c_int,
         C.c_bool,
         C.c_void_p,
+        auto_encode=False,
     )
     # int mosquitto_subscribe(struct mosquitto *mosq, int *mid, const char *sub, int qos)
     _subscribe = Method(
@@ -614,7 +1465,7 @@ class Mosquitto:
         C.c_int, libmosq.mosquitto_void_option, C.c_void_p, C.c_int, C.c_void_p
     )
     # int mosquitto_reconnect_delay_set(struct mosquitto *mosq, unsigned int reconnect_delay, unsigned int reconnect_delay_max, bool reconnect_exponential_backoff)
-    reconnect_delay_set = Method(
+    _reconnect_delay_set = Method(
         C.c_int,
         libmosq.mosquitto_reconnect_delay_set,
         C.c_void_p,
@@ -674,51 +1525,15 @@ class Mosquitto:
     ssl_get = Method(C.c_void_p, libmosq.mosquitto_ssl_get, C.c_void_p)
 
     # Callbacks
-    on_connect = Callback(
-        libmosq.mosquitto_connect_callback_set,
-        ON_CONNECT,
-        _connect_callback_wrapper,
-    )
-    on_connect_with_flags = Callback(
-        libmosq.mosquitto_connect_with_flags_callback_set,
-        ON_CONNECT_WITH_FLAGS,
-        _connect_with_flags_callback_wrapper,
-    )
-    on_connect_v5 = Callback(
-        libmosq.mosquitto_connect_v5_callback_set,
-        ON_CONNECT_V5,
-        _connect_v5_callback_wrapper,
-    )
-    on_disconnect = Callback(
-        libmosq.mosquitto_disconnect_callback_set,
-        ON_DISCONNECT,
-        _disconnect_callback_wrapper,
-    )
-    on_disconnect_v5 = Callback(
-        libmosq.mosquitto_disconnect_v5_callback_set,
-        ON_DISCONNECT_V5,
-        _disconnect_v5_callback_wrapper,
-    )
-    on_publish = Callback(
-        libmosq.mosquitto_publish_callback_set,
-        ON_PUBLISH,
-        _publish_callback_wrapper,
-    )
-    on_publish_v5 = Callback(
-        libmosq.mosquitto_publish_v5_callback_set,
-        ON_PUBLISH_V5,
-        _publish_v5_callback_wrapper,
-    )
-    on_message = Callback(
-        libmosq.mosquitto_message_callback_set,
-        ON_MESSAGE,
-        _message_callback_wrapper,
-    )
-    on_message_v5 = Callback(
-        libmosq.mosquitto_message_v5_callback_set,
-        ON_MESSAGE_V5,
-        _message_v5_callback_wrapper,
-    )
+    on_connect = Callback()
+    on_connect_with_flags = Callback()
+    on_connect_v5 = Callback()
+    on_disconnect = Callback()
+    on_disconnect_v5 = Callback()
+    on_publish = Callback()
+    on_publish_v5 = Callback()
+    on_message = Callback()
+    on_message_v5 = Callback()
     on_subscribe = Callback(
         libmosq.mosquitto_subscribe_callback_set,
         ON_SUBSCRIBE,
@@ -757,7 +1572,54 @@ class Mosquitto:
         C.c_char_p,
     )
 
+    @property
+    def on_messages(self):
+        return self._on_messages
+
+    @on_messages.setter
+    def on_messages(self, callback):
+        # batch mode is built on top of on_message, which is restored when it's cleared
+        if callback and self._on_messages is None:
+            self._prev_on_message = self.on_message
+        self._on_messages = callback
+        if callback:
+            self.on_message = _batch_message_callback
+            return
+        self.on_message = self._prev_on_message
+        self._prev_on_message = None
+        with self._batch_cond:
+            self._batch = []
+            # the flusher exits once it's no longer the current one
+            self._flusher = None
+            self._batch_cond.notify_all()
+
+    def _start_flusher(self):
+        # called with `_batch_cond` held
+        self._flusher = threading.Thread(
+            target=_run_batch_flusher,
+            args=(weakref.ref(self), self._batch_cond),
+            name="pymosquitto-batch-flusher",
+            daemon=True,
+        )
+        self._flusher.start()
+
+    def flush_messages(self):
+        with self._deliver_lock:
+            with self._batch_cond:
+                if not (self._batch and self._on_messages):
+                    return
+                batch, self._batch = self._batch, []
+            stats = self._stats
+            stats.callbacks["messages"] += 1
+            started = time.perf_counter_ns()
+            try:
+                self._on_messages(self, self._userdata, batch)
+            finally:
+                stats.callback_ns += time.perf_counter_ns() - started
+
     def connect(self, host, port=1883, keepalive=60, bind_address=None, props=None):
+        self._disconnecting = False
+        self._keepalive = keepalive
         host = host.encode()
         bind_address = bind_address.encode() if bind_address else None
         if bind_address and props:
@@ -768,10 +1630,15 @@ class Mosquitto:
             return self.connect_bind_v5(host, port, keepalive, None, props)
         return self._connect(host, port, keepalive)
 
-    def connect_async(self, host, port=1883, keepalive=60):
+    def connect_async(self, host, port=1883, keepalive=60, bind_address=None):
+        self._disconnecting = False
+        self._keepalive = keepalive
+        if bind_address:
+            return self.connect_bind_async(host, port, keepalive, bind_address)
         return self._connect_async(host.encode(), port, keepalive)
 
     def disconnect(self, strict=True):
+        self._disconnecting = True
         if strict:
             self._disconnect()
         else:
@@ -785,19 +1652,74 @@ class Mosquitto:
         fd = self._socket()
         return None if fd == -1 else fd
 
-    def loop_forever(self, timeout=-1):
-        return self._loop_forever(timeout, 1)
+    def loop_forever(self, timeout=-1, max_packets=1):
+        if self._on_messages is None:
+            return self._loop_forever(timeout, max_packets)
+        self._batch_looping = True
+        try:
+            return self._loop_forever_batched(timeout, max_packets)
+        finally:
+            self._batch_looping = False
+
+    # mirrors mosquitto_loop_forever, but flushes the message batch between loop passes
+    def _loop_forever_batched(self, timeout, max_packets):
+        latency = int(self._batch_latency * 1000)
+        reconnects = 0
+        while True:
+            try:
+                while True:
+                    self.loop(latency if self._batch else timeout, max_packets)
+                    reconnects = 0
+                    if self._batch and time.monotonic() >= self._batch_deadline:
+                        self.flush_messages()
+            except MosquittoError as e:
+                self.flush_messages()
+                if e.code in _LOOP_FATAL_ERRORS:
+                    raise e
+            while True:
+                if self._disconnecting:
+                    return ErrorCode.SUCCESS
+                time.sleep(self._get_reconnect_delay(reconnects))
+                reconnects += 1
+                try:
+                    self.reconnect()
+                    break
+                except MosquittoError:
+                    pass
+
+    def _get_reconnect_delay(self, reconnects):
+        delay, delay_max, exponential_backoff = self._reconnect_delay
+        if delay_max > delay:
+            if exponential_backoff:
+                delay = delay * (reconnects + 1) * (reconnects + 1)
+            else:
+                delay = delay * (reconnects + 1)
+        return min(delay, delay_max)
+
+    def reconnect_delay_set(
+        self, reconnect_delay, reconnect_delay_max, reconnect_exponential_backoff
+    ):
+        self._reconnect_delay_set(
+            reconnect_delay, reconnect_delay_max, reconnect_exponential_backoff
+        )
+        self._reconnect_delay = (
+            reconnect_delay,
+            reconnect_delay_max,
+            reconnect_exponential_backoff,
+        )
 
     def publish(self, topic, payload, qos=0, retain=False, props=None):
         mid = C.c_int(0)
-        if isinstance(payload, str):
-            payload = payload.encode()
+        if payload.__class__ is bytes:
+            payloadlen = len(payload)
+        else:
+            payloadlen, payload = _payload_ref(payload)
         if props:
             self._publish_v5(
                 C.byref(mid),
                 topic.encode(),
-                len(payload),
-                C.c_char_p(payload),
+                payloadlen,
+                payload,
                 qos,
                 retain,
                 props,
@@ -806,13 +1728,36 @@ class Mosquitto:
             self._publish(
                 C.byref(mid),
                 topic.encode(),
-                len(payload),
-                C.c_char_p(payload),
+                payloadlen,
+                payload,
                 qos,
                 retain,
             )
+        stats = self._stats
+        stats.messages_out[qos] += 1
+        stats.bytes_out[qos] += payloadlen
         return mid.value
 
+    def publish_many(self, messages):
+        mid = C.c_int(0)
+        mid_ref = C.byref(mid)
+        publish = self._publish
+        stats = self._stats
+        mids = []
+        for topic, payload, qos, retain in messages:
+            if payload.__class__ is bytes:
+                payloadlen = len(payload)
+            else:
+                payloadlen, payload = _payload_ref(payload)
+            publish(mid_ref, topic.encode(), payloadlen, payload, qos, retain)
+            stats.messages_out[qos] += 1
+            stats.bytes_out[qos] += payloadlen
+            mids.append(mid.value)
+        return mids
+
+    def prepare_publish(self, topic, qos=0, retain=False, props=None):
+        return PublishHandle(self, topic, qos, retain, props)
+
     def subscribe(self, topic, qos=0, props=None):
         mid = C.c_int(0)
         if props:
@@ -834,3 +1779,6 @@ class Mosquitto:
 
     def userdata(self):
         return self._userdata
+
+    def stats(self):
+        return self._stats.snapshot()
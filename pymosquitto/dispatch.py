@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import threading
+import time
+import typing as t
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .client import MQTTMessageView
+
+logger = logging.getLogger(__name__)
+
+# a hot key yields its worker after this many messages, so other keys get a turn
+DRAIN_BATCH = 64
+# drained partitions kept for their stats, the least recently used are forgotten
+MAX_IDLE_PARTITIONS = 1024
+
+
+def topic_key(msg: t.Any) -> str:
+    return msg.topic
+
+
+@dataclass(frozen=True, slots=True)
+class PartitionStats:
+    depth: int
+    processed: int
+    errors: int
+    # age of the oldest queued message in seconds
+    lag: float
+
+
+class _Partition:
+    __slots__ = ("key", "queue", "running", "processed", "errors")
+
+    def __init__(self, key: t.Hashable) -> None:
+        self.key = key
+        self.queue: deque = deque()
+        self.running = False
+        self.processed = 0
+        self.errors = 0
+
+    def stats(self, now: float) -> PartitionStats:
+        queue = self.queue
+        return PartitionStats(
+            depth=len(queue),
+            processed=self.processed,
+            errors=self.errors,
+            lag=now - queue[0][0] if queue else 0.0,
+        )
+
+
+def _get_partition(
+    partitions: dict[t.Hashable, _Partition], idle: OrderedDict, key: t.Hashable
+) -> _Partition:
+    part = partitions.get(key)
+    if part is None:
+        part = partitions[key] = _Partition(key)
+    else:
+        idle.pop(key, None)
+    return part
+
+
+def _retire_partition(
+    partitions: dict[t.Hashable, _Partition],
+    idle: OrderedDict,
+    part: _Partition,
+    max_idle: int,
+) -> None:
+    idle[part.key] = None
+    if len(idle) > max_idle:
+        del partitions[idle.popitem(last=False)[0]]
+
+
+def _report_error(
+    on_error: t.Optional[t.Callable[[t.Any, Exception], t.Any]],
+    msg: t.Any,
+    exc: Exception,
+) -> None:
+    # a failing error handler mustn't stall its key
+    if on_error is None:
+        return
+    try:
+        on_error(msg, exc)
+    except Exception:
+        logger.exception("on_error failed for %r", msg)
+
+
+class KeyedExecutor:
+    def __init__(
+        self,
+        handler: t.Callable[[t.Any], t.Any],
+        max_workers: t.Optional[int] = None,
+        key: t.Callable[[t.Any], t.Hashable] = topic_key,
+        executor: t.Optional[Executor] = None,
+        on_error: t.Optional[t.Callable[[t.Any, Exception], t.Any]] = None,
+        max_idle: int = MAX_IDLE_PARTITIONS,
+    ) -> None:
+        self._handler = handler
+        self._key = key
+        self._on_error = on_error
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers)
+        self._partitions: dict[t.Hashable, _Partition] = {}
+        self._idle_keys: OrderedDict = OrderedDict()
+        self._max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._active = 0
+
+    def __enter__(self) -> "KeyedExecutor":
+        return self
+
+    def __exit__(self, *_: t.Any) -> None:
+        self.shutdown()
+
+    def submit(self, msg: t.Any) -> None:
+        key = self._key(msg)
+        with self._lock:
+            part = _get_partition(self._partitions, self._idle_keys, key)
+            part.queue.append((time.monotonic(), msg))
+            if part.running:
+                return
+            part.running = True
+            self._active += 1
+        self._executor.submit(self._drain, part)
+
+    # ready-made `on_message` callback
+    def on_message(self, client: t.Any, userdata: t.Any, msg: t.Any) -> None:
+        if isinstance(msg, MQTTMessageView):
+            msg = msg.detach()
+        self.submit(msg)
+
+    def _drain(self, part: _Partition) -> None:
+        queue = part.queue
+        for _ in range(DRAIN_BATCH):
+            with self._lock:
+                if not queue:
+                    part.running = False
+                    _retire_partition(
+                        self._partitions, self._idle_keys, part, self._max_idle
+                    )
+                    self._active -= 1
+                    if not self._active:
+                        self._idle.notify_all()
+                    return
+                _, msg = queue[0]
+            failed = False
+            try:
+                self._handler(msg)
+            except Exception as e:
+                failed = True
+                _report_error(self._on_error, msg, e)
+            finally:
+                # the message stays queued while it's handled, so the lag covers it
+                with self._lock:
+                    queue.popleft()
+                    part.processed += 1
+                    part.errors += failed
+        self._executor.submit(self._drain, part)
+
+    def stats(self) -> dict[t.Hashable, PartitionStats]:
+        now = time.monotonic()
+        with self._lock:
+            return {key: part.stats(now) for key, part in self._partitions.items()}
+
+    def join(self, timeout: t.Optional[float] = None) -> bool:
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._active, timeout)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if wait:
+            self.join()
+        if self._own_executor:
+            self._executor.shutdown(wait)
+
+
+class AsyncKeyedExecutor:
+    def __init__(
+        self,
+        handler: t.Callable[[t.Any], t.Awaitable[t.Any]],
+        concurrency: int = 100,
+        key: t.Callable[[t.Any], t.Hashable] = topic_key,
+        on_error: t.Optional[t.Callable[[t.Any, Exception], t.Any]] = None,
+        max_idle: int = MAX_IDLE_PARTITIONS,
+    ) -> None:
+        self._handler = handler
+        self._key = key
+        self._on_error = on_error
+        self._concurrency = concurrency
+        self._sem: t.Optional[asyncio.Semaphore] = None
+        self._partitions: dict[t.Hashable, _Partition] = {}
+        self._idle_keys: OrderedDict = OrderedDict()
+        self._max_idle = max_idle
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, msg: t.Any) -> None:
+        key = self._key(msg)
+        part = _get_partition(self._partitions, self._idle_keys, key)
+        part.queue.append((time.monotonic(), msg))
+        if not part.running:
+            part.running = True
+            task = asyncio.get_running_loop().create_task(self._drain(part))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, part: _Partition) -> None:
+        if self._sem is None:
+            # created lazily to bind to the running loop
+            self._sem = asyncio.Semaphore(self._concurrency)
+        queue = part.queue
+        try:
+            while queue:
+                _, msg = queue[0]
+                async with self._sem:
+                    try:
+                        await self._handler(msg)
+                    except Exception as e:
+                        part.errors += 1
+                        _report_error(self._on_error, msg, e)
+                    finally:
+                        queue.popleft()
+                        part.processed += 1
+        finally:
+            part.running = False
+            _retire_partition(self._partitions, self._idle_keys, part, self._max_idle)
+
+    async def run(self, client: t.Any) -> None:
+        async for msg in client.read_messages():
+            self.submit(msg)
+        await self.join()
+
+    async def join(self) -> None:
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    def stats(self) -> dict[t.Hashable, PartitionStats]:
+        now = time.monotonic()
+        return {key: part.stats(now) for key, part in self._partitions.items()}
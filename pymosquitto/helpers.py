@@ -1,4 +1,5 @@
 import ctypes as C
+import functools
 import typing as t
 
 from .bindings import libmosq, bind
@@ -10,7 +11,7 @@ libc = None
 _signal_handlers: dict[int, t.Any] = {}
 
 
-def topic_matches_sub(sub: str, topic: str) -> bool:
+def libmosq_topic_matches_sub(sub: str, topic: str) -> bool:
     res = C.c_bool(False)
     call(
         libmosq.mosquitto_topic_matches_sub, sub.encode(), topic.encode(), C.byref(res)
@@ -18,21 +19,143 @@ def topic_matches_sub(sub: str, topic: str) -> bool:
     return res.value
 
 
-class TopicMatcher:
+def _is_valid_topic(topic: str) -> bool:
+    return bool(topic) and "+" not in topic and "#" not in topic
+
+
+# a sub level containing a wildcard as part of the level never equals a topic level,
+# so invalid filters don't match anything, just like in libmosquitto
+def _levels_match(sub_levels: list[str], levels: list[str], is_sys: bool) -> bool:
+    if is_sys and sub_levels[0] in ("+", "#"):
+        return False
+    depth = len(levels)
+    for i, level in enumerate(sub_levels):
+        if level == "#":
+            return i == len(sub_levels) - 1
+        if i == depth:
+            return False
+        if level != "+" and level != levels[i]:
+            return False
+    return len(sub_levels) == depth
+
+
+def topic_matches_sub(sub: str, topic: str) -> bool:
+    if not sub or not _is_valid_topic(topic):
+        return False
+    if sub == topic:
+        return True
+    return _levels_match(sub.split("/"), topic.split("/"), topic[0] == "$")
+
+
+def topics_match_sub(sub: str, topics: t.Iterable[str]) -> list[bool]:
+    if not sub:
+        return [False for _ in topics]
+    if "+" not in sub and "#" not in sub:
+        return [topic == sub for topic in topics]
+    sub_levels = sub.split("/")
+    return [
+        _is_valid_topic(topic)
+        and _levels_match(sub_levels, topic.split("/"), topic[0] == "$")
+        for topic in topics
+    ]
+
+
+def sub_matches_topics(subs: t.Iterable[str], topic: str) -> list[bool]:
+    if not _is_valid_topic(topic):
+        return [False for _ in subs]
+    levels = topic.split("/")
+    is_sys = topic[0] == "$"
+    return [
+        sub == topic or (bool(sub) and _levels_match(sub.split("/"), levels, is_sys))
+        for sub in subs
+    ]
+
+
+class _TopicNode:
+    __slots__ = ("children", "sub")
+
     def __init__(self) -> None:
+        self.children: dict[str, "_TopicNode"] = {}
+        self.sub: t.Optional[str] = None
+
+
+class TopicMatcher:
+    def __init__(self, cache_size: int = 1024) -> None:
         self._handlers: dict[str, t.Callable] = {}
+        self._order: dict[str, int] = {}
+        self._seq = 0
+        self._root = _TopicNode()
+        self._match = functools.lru_cache(maxsize=cache_size)(self._find_handlers)
 
     def find(self, topic: str) -> t.Iterator[t.Callable]:
-        for sub, func in self._handlers.items():
-            if topic_matches_sub(sub, topic):
-                yield func
+        return iter(self._match(topic))
+
+    def _find_handlers(self, topic: str) -> tuple[t.Callable, ...]:
+        if not topic or "+" in topic or "#" in topic:
+            return ()
+        levels = topic.split("/")
+        depth = len(levels)
+        # wildcards at the first level don't match topics starting with "$"
+        is_sys = topic.startswith("$")
+        subs = []
+        stack = [(self._root, 0)]
+        while stack:
+            node, i = stack.pop()
+            children = node.children
+            wildcards = i or not is_sys
+            if wildcards and "#" in children:
+                sub = children["#"].sub
+                if sub is not None:
+                    subs.append(sub)
+            if i == depth:
+                if node.sub is not None:
+                    subs.append(node.sub)
+                continue
+            child = children.get(levels[i])
+            if child is not None:
+                stack.append((child, i + 1))
+            if wildcards:
+                child = children.get("+")
+                if child is not None:
+                    stack.append((child, i + 1))
+        subs.sort(key=self._order.__getitem__)
+        return tuple(self._handlers[sub] for sub in subs)
 
     def set_topic_callback(self, topic: str, callback: t.Callable) -> None:
         if callback is None:
             if topic in self._handlers:
                 del self._handlers[topic]
+                del self._order[topic]
+                self._remove(topic)
         else:
+            if topic not in self._handlers:
+                self._order[topic] = self._seq
+                self._seq += 1
+                self._insert(topic)
             self._handlers[topic] = callback
+        self._match.cache_clear()
+
+    def _insert(self, topic: str) -> None:
+        node = self._root
+        for level in topic.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _TopicNode()
+            node = child
+        node.sub = topic
+
+    def _remove(self, topic: str) -> None:
+        path = [self._root]
+        levels = topic.split("/")
+        for level in levels:
+            path.append(path[-1].children[level])
+        path[-1].sub = None
+        # prune the branch bottom-up while nodes are empty
+        for i in range(len(levels), 0, -1):
+            node = path[i]
+            if node.sub is not None or node.children:
+                break
+            del path[i - 1].children[levels[i - 1]]
 
     def on_topic(self, topic: str) -> t.Callable:
         def decorator(func: t.Callable) -> t.Callable:
@@ -0,0 +1,175 @@
+import multiprocessing as mp
+import os
+import signal
+import time
+import typing as t
+from dataclasses import dataclass
+
+from .client import Mosquitto
+from .constants import ConnackCode
+from .helpers import csignal
+
+
+@dataclass(frozen=True, slots=True)
+class WorkerStats:
+    index: int
+    pid: t.Optional[int]
+    alive: bool
+    restarts: int
+    messages: int
+
+
+def _run_worker(
+    index, counters, handler, setup, sub, qos, host, port, keepalive, client_kwargs
+):
+    client = Mosquitto(**client_kwargs)
+    if setup:
+        setup(client)
+
+    def on_connect(client, userdata, rc):
+        if rc == ConnackCode.ACCEPTED:
+            client.subscribe(sub, qos)
+
+    def on_message(client, userdata, msg):
+        handler(client, userdata, msg)
+        counters[index] += 1
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+    # loop_forever blocks in C, so SIGTERM is handled by a C-level handler
+    csignal(signal.SIGTERM, lambda _: client.disconnect(strict=False))
+    client.connect(host, port, keepalive)
+    client.loop_forever()
+
+
+class ConsumerPool:
+    def __init__(
+        self,
+        handler: t.Callable,
+        topic: str,
+        group: str,
+        workers: t.Optional[int] = None,
+        qos: int = 0,
+        host: str = "localhost",
+        port: int = 1883,
+        keepalive: int = 60,
+        setup: t.Optional[t.Callable[[Mosquitto], None]] = None,
+        restart_delay: float = 1.0,
+        context: t.Optional[t.Any] = None,
+        **client_kwargs: t.Any,
+    ) -> None:
+        self._handler = handler
+        self._sub = f"$share/{group}/{topic}"
+        self._size = workers or os.cpu_count() or 1
+        self._qos = qos
+        self._host = host
+        self._port = port
+        self._keepalive = keepalive
+        self._setup = setup
+        self._restart_delay = restart_delay
+        self._client_kwargs = client_kwargs
+        self._ctx = context or mp.get_context()
+        # written by one worker each, read without locking by the parent
+        self._counters = self._ctx.RawArray("Q", self._size)
+        self._procs: list[t.Any] = [None] * self._size
+        self._started_at = [0.0] * self._size
+        self._restarts = [0] * self._size
+        self._stopping = False
+
+    def __enter__(self) -> "ConsumerPool":
+        self.start()
+        return self
+
+    def __exit__(self, *_: t.Any) -> None:
+        self.stop()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def subscription(self) -> str:
+        return self._sub
+
+    def start(self) -> None:
+        self._stopping = False
+        for index in range(self._size):
+            self._spawn(index)
+
+    def _spawn(self, index: int) -> None:
+        proc = self._ctx.Process(
+            target=_run_worker,
+            args=(
+                index,
+                self._counters,
+                self._handler,
+                self._setup,
+                self._sub,
+                self._qos,
+                self._host,
+                self._port,
+                self._keepalive,
+                self._client_kwargs,
+            ),
+            name=f"pymosquitto-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        self._procs[index] = proc
+        self._started_at[index] = time.monotonic()
+
+    # restarts dead workers, returns how many were restarted
+    def check(self) -> int:
+        if self._stopping:
+            return 0
+        restarted = 0
+        now = time.monotonic()
+        for index, proc in enumerate(self._procs):
+            if proc is None or proc.is_alive():
+                continue
+            # a worker crashing on start is restarted at most once per restart_delay
+            if now - self._started_at[index] < self._restart_delay:
+                continue
+            proc.join()
+            self._spawn(index)
+            self._restarts[index] += 1
+            restarted += 1
+        return restarted
+
+    def run(self, interval: float = 1.0) -> None:
+        self.start()
+        try:
+            while not self._stopping:
+                time.sleep(interval)
+                self.check()
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopping = True
+        procs = [proc for proc in self._procs if proc is not None]
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + timeout
+        for proc in procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+
+    def stats(self) -> list[WorkerStats]:
+        return [
+            WorkerStats(
+                index=index,
+                pid=proc.pid if proc is not None else None,
+                alive=proc is not None and proc.is_alive(),
+                restarts=self._restarts[index],
+                messages=self._counters[index],
+            )
+            for index, proc in enumerate(self._procs)
+        ]
+
+    @property
+    def messages(self) -> int:
+        return sum(self._counters)
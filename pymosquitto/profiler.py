@@ -0,0 +1,226 @@
+import threading
+import time
+import typing as t
+
+from . import bindings as b
+from .client import Properties, _dispatch_message
+
+# the callback prototypes with arguments to call them with, for the trampoline estimate
+_PROTOTYPES = {
+    "connect": (b.ON_CONNECT_V5, (None, None, 0, 0, None)),
+    "disconnect": (b.ON_DISCONNECT_V5, (None, None, 0, None)),
+    "publish": (b.ON_PUBLISH_V5, (None, None, 0, None)),
+    "message": (b.ON_MESSAGE_V5, (None, None, None, None)),
+    "subscribe": (b.ON_SUBSCRIBE, (None, None, 0, 0, None)),
+    "unsubscribe": (b.ON_UNSUBSCRIBE, (None, None, 0)),
+    "log": (b.ON_LOG, (None, None, 0, b"")),
+}
+
+# not timed per sample: the ctypes trampoline cost can't be measured from inside the
+# callback, `calibrate()` estimates it once per callback type
+TRAMPOLINE = "trampoline (est.)"
+
+
+class Histogram:
+    # log-linear buckets like HdrHistogram: values below 2**bits are exact, above that
+    # every power of two is split into 2**(bits - 1) linear buckets, so a recorded value
+    # is off by less than 1/2**(bits - 1) of itself
+    def __init__(self, bits: int = 8) -> None:
+        self._bits = bits
+        self._half = 1 << (bits - 1)
+        self._counts = [0] * ((64 - bits + 2) * self._half)
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        value = max(0, value)
+        shift = max(0, value.bit_length() - self._bits)
+        self._counts[(shift * self._half) + (value >> shift)] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def _value(self, index: int) -> int:
+        if index < 2 * self._half:
+            return index
+        shift = (index >> (self._bits - 1)) - 1
+        # the highest value the bucket holds
+        return ((index - shift * self._half + 1) << shift) - 1
+
+    def percentile(self, p: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(1, -(-self.total * p // 100))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(self._value(index), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.total if self.total else 0.0
+
+
+def _noop(*_: t.Any) -> None:
+    pass
+
+
+def _best_ns(func: t.Callable[[], t.Any], number: int, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter_ns() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / number
+
+
+def estimate_trampoline(name: str, number: int = 20_000) -> float:
+    # calls a no-op through the callback's CFUNCTYPE from Python, minus calling it
+    # directly; that crosses the ctypes boundary both ways, so it's an upper bound
+    # of what a call from libmosquitto costs
+    prototype, args = _PROTOTYPES[name]
+    thunk = prototype(_noop)
+    through = _best_ns(lambda: thunk(*args), number)
+    direct = _best_ns(lambda: _noop(*args), number)
+    return max(0.0, through - direct)
+
+
+class CallbackProfiler:
+    # profiles one in `sample_rate` callback invocations of the clients it's attached to,
+    # the others pay for a countdown only; the sampled stages are convert (the enum,
+    # message and property conversions), handler and release, the trampoline figure
+    # is the calibrated estimate, not a measurement
+    def __init__(self, sample_rate: int = 1000) -> None:
+        if sample_rate < 1:
+            raise ValueError("sample_rate must be at least 1")
+        self._rate = sample_rate
+        self._countdown = sample_rate
+        self._stages: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+        self.trampoline: dict[str, float] = {}
+
+    @property
+    def sample_rate(self) -> int:
+        return self._rate
+
+    def attach(self, client: t.Any) -> "CallbackProfiler":
+        # async clients are profiled through their Mosquitto instance
+        getattr(client, "mosq", client)._profiler = self
+        return self
+
+    def detach(self, client: t.Any) -> None:
+        getattr(client, "mosq", client)._profiler = None
+
+    def calibrate(self, number: int = 20_000) -> dict[str, float]:
+        self.trampoline = {
+            name: estimate_trampoline(name, number) for name in _PROTOTYPES
+        }
+        return self.trampoline
+
+    def sample(self) -> bool:
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self._rate
+        return True
+
+    def record(self, callback: str, stage: str, ns: int) -> None:
+        key = (callback, stage)
+        hist = self._stages.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._stages.setdefault(key, Histogram())
+        hist.record(ns)
+
+    def run(
+        self,
+        client: t.Any,
+        name: str,
+        callback: t.Callable[..., t.Any],
+        convert: t.Callable[..., tuple],
+        *raw: t.Any,
+    ) -> None:
+        # `convert` turns the raw C arguments into the ones the callback gets
+        now = time.perf_counter_ns
+        stats = client._stats
+        stats.callbacks[name] += 1
+        started = now()
+        args = convert(*raw)
+        converted = now()
+        try:
+            callback(client, client.userdata(), *args)
+        finally:
+            handled = now()
+            for arg in args:
+                if arg.__class__ is Properties:
+                    arg.release()
+            released = now()
+            stats.callback_ns += handled - converted
+            self.record(name, "convert", converted - started)
+            self.record(name, "handler", handled - converted)
+            self.record(name, "release", released - handled)
+
+    def run_message(self, client: t.Any, msg: t.Any, prop: t.Any = None) -> None:
+        # the client's own message path, with the stage boundaries collected
+        marks: list[int] = []
+        started = time.perf_counter_ns()
+        try:
+            _dispatch_message(
+                client, msg, prop, client.on_message, client.on_message_v5, marks
+            )
+        finally:
+            if len(marks) == 3:
+                converted, handled, released = marks
+                self.record("message", "convert", converted - started)
+                self.record("message", "handler", handled - converted)
+                self.record("message", "release", released - handled)
+
+    def _rows(self) -> list[tuple[str, str, Histogram]]:
+        with self._lock:
+            return sorted(
+                (callback, stage, hist)
+                for (callback, stage), hist in self._stages.items()
+            )
+
+    def report(self) -> str:
+        lines = ["Callback;Stage;Samples;Mean us;p50 us;p99 us;Max us"]
+        seen = set()
+        for callback, stage, hist in self._rows():
+            if callback not in seen and callback in self.trampoline:
+                seen.add(callback)
+                us = self.trampoline[callback] / 1000
+                lines.append(f"{callback};{TRAMPOLINE};-;{us:.2f};-;-;-")
+            lines.append(
+                f"{callback};{stage};{hist.total};{hist.mean() / 1000:.2f};"
+                f"{hist.percentile(50) / 1000:.2f};{hist.percentile(99) / 1000:.2f};"
+                f"{hist.max / 1000:.2f}"
+            )
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        # flamegraph.pl / speedscope "collapsed" stacks, sampled nanoseconds per stage;
+        # the trampoline frame is the estimate times the number of samples
+        lines = []
+        seen = set()
+        for callback, stage, hist in self._rows():
+            frame = f"pymosquitto;on_{callback}"
+            if callback not in seen and callback in self.trampoline:
+                seen.add(callback)
+                ns = round(self.trampoline[callback] * hist.total)
+                lines.append(f"{frame};{TRAMPOLINE} {ns}")
+            lines.append(f"{frame};{stage} {hist.sum}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
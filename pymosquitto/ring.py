@@ -0,0 +1,207 @@
+import asyncio
+import multiprocessing as mp
+import os
+import struct
+import time
+import traceback
+import typing as t
+from multiprocessing import shared_memory
+
+from .client import MQTTMessage
+
+# mid, topic length, payload length, qos, retain
+_HEADER = struct.Struct("<iHIBB")
+# a payload length no MQTT message can have
+_STOP = 0xFFFFFFFF
+
+
+def _run_worker(
+    name, slots, slot_size, free, used, lock, tail, errors, handler, on_error
+):
+    shm = shared_memory.SharedMemory(name=name)
+    buf = shm.buf
+    header = _HEADER
+    try:
+        while True:
+            used.acquire()
+            with lock:
+                offset = (tail.value % slots) * slot_size
+                mid, topic_len, payload_len, qos, retain = header.unpack_from(
+                    buf, offset
+                )
+                if payload_len == _STOP:
+                    # the sentinel stays for the other workers
+                    used.release()
+                    break
+                offset += header.size
+                topic = bytes(buf[offset : offset + topic_len])
+                offset += topic_len
+                payload = bytes(buf[offset : offset + payload_len])
+                tail.value += 1
+            free.release()
+            msg = MQTTMessage(mid, topic.decode(), payload, qos, bool(retain))
+            try:
+                handler(msg)
+            except Exception as e:
+                with lock:
+                    errors.value += 1
+                # a worker process has nobody else to report to
+                if on_error:
+                    on_error(msg, e)
+                else:
+                    traceback.print_exc()
+    finally:
+        del buf
+        shm.close()
+
+
+class RingDispatcher:
+    def __init__(
+        self,
+        handler: t.Callable[[MQTTMessage], t.Any],
+        workers: t.Optional[int] = None,
+        slots: int = 1024,
+        slot_size: int = 64 * 1024,
+        block: bool = True,
+        context: t.Optional[t.Any] = None,
+        on_error: t.Optional[t.Callable[[MQTTMessage, Exception], t.Any]] = None,
+    ) -> None:
+        if slot_size <= _HEADER.size:
+            raise ValueError(f"slot_size must be greater than {_HEADER.size}")
+        self._handler = handler
+        self._on_error = on_error
+        self._size = (os.cpu_count() or 1) if workers is None else workers
+        self._slots = slots
+        self._slot_size = slot_size
+        self._block = block
+        self._ctx = context or mp.get_context()
+        self._free = self._ctx.Semaphore(slots)
+        self._used = self._ctx.Semaphore(0)
+        self._lock = self._ctx.Lock()
+        self._tail = self._ctx.RawValue("Q", 0)
+        self._errors = self._ctx.RawValue("Q", 0)
+        self._head = 0
+        self._shm: t.Optional[shared_memory.SharedMemory] = None
+        self._buf: t.Optional[memoryview] = None
+        self._procs: list[t.Any] = []
+        self.dispatched = 0
+        self.dropped = 0
+
+    def __enter__(self) -> "RingDispatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *_: t.Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._shm = shared_memory.SharedMemory(
+            create=True, size=self._slots * self._slot_size
+        )
+        self._buf = self._shm.buf
+        for _ in range(self._size):
+            proc = self._ctx.Process(
+                target=_run_worker,
+                args=(
+                    self._shm.name,
+                    self._slots,
+                    self._slot_size,
+                    self._free,
+                    self._used,
+                    self._lock,
+                    self._tail,
+                    self._errors,
+                    self._handler,
+                    self._on_error,
+                ),
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+
+    @property
+    def errors(self) -> int:
+        return self._errors.value
+
+    # waits up to `timeout` seconds for the workers to drain the ring, then kills them
+    def stop(self, timeout: float = 5.0) -> None:
+        if self._shm is None:
+            return
+        if self._procs:
+            deadline = time.monotonic() + timeout
+            if self._free.acquire(timeout=timeout):
+                _HEADER.pack_into(self._buf, self._offset(), 0, 0, _STOP, 0, 0)
+                self._used.release()
+            for proc in self._procs:
+                proc.join(max(0.0, deadline - time.monotonic()))
+                if proc.is_alive():
+                    proc.kill()
+                    proc.join()
+            self._procs = []
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def _offset(self) -> int:
+        offset = (self._head % self._slots) * self._slot_size
+        self._head += 1
+        return offset
+
+    def _encode_topic(self, msg: t.Any) -> t.Optional[bytes]:
+        topic = msg.topic.encode()
+        if _HEADER.size + len(topic) + len(msg.payload) > self._slot_size:
+            self.dropped += 1
+            return None
+        return topic
+
+    # writes a message into the ring, returns False if it was dropped
+    def put(self, msg: t.Any, block: t.Optional[bool] = None) -> bool:
+        topic = self._encode_topic(msg)
+        if topic is None:
+            return False
+        if not self._free.acquire(self._block if block is None else block):
+            self.dropped += 1
+            return False
+        self._write(msg, topic)
+        return True
+
+    def _write(self, msg: t.Any, topic: bytes) -> None:
+        buf = self._buf
+        payload = msg.payload
+        topic_len = len(topic)
+        payload_len = len(payload)
+        offset = self._offset()
+        _HEADER.pack_into(
+            buf, offset, msg.mid, topic_len, payload_len, msg.qos, msg.retain
+        )
+        offset += _HEADER.size
+        buf[offset : offset + topic_len] = topic
+        offset += topic_len
+        buf[offset : offset + payload_len] = payload
+        self._used.release()
+        self.dispatched += 1
+
+    # ready-made `on_message` callback, blocks the network loop while the ring is full
+    def on_message(self, client: t.Any, userdata: t.Any, msg: t.Any) -> None:
+        self.put(msg)
+
+    async def consume(self, client: t.Any) -> None:
+        loop = asyncio.get_running_loop()
+        async for msg in client.read_messages():
+            topic = self._encode_topic(msg)
+            if topic is None:
+                continue
+            if not self._free.acquire(False):
+                if not self._block:
+                    self.dropped += 1
+                    continue
+                # wait for a free slot without blocking the event loop
+                acquired = loop.run_in_executor(None, self._free.acquire)
+                try:
+                    await asyncio.shield(acquired)
+                except asyncio.CancelledError:
+                    # the executor thread still takes the slot, give it back
+                    acquired.add_done_callback(lambda _: self._free.release())
+                    raise
+            self._write(msg, topic)
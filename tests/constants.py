@@ -4,3 +4,5 @@ HOST, _port = os.getenv("MQTT_URL", "broker.hivemq.com:1883").split(":")
 PORT = int(_port)
 USERNAME = os.getenv("MQTT_USERNAME", "")
 PASSWORD = os.getenv("MQTT_PASSWORD", "")
+# opt-in for long-running tests, e.g. the leak checks
+SLOW = bool(os.getenv("SLOW_TESTS"))
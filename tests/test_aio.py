@@ -1,19 +1,34 @@
 import asyncio
+from types import SimpleNamespace
 
 import pytest
 
+from pymosquitto import aio
 from pymosquitto.constants import ConnackCode
-from pymosquitto.aio import AsyncMosquitto, TrueAsyncMosquitto
+from pymosquitto.aio import (
+    AsyncMosquitto,
+    TrueAsyncMosquitto,
+    MessageQueue,
+    OverflowPolicy,
+    resolve_host,
+)
 
 import constants as c
 
 CLIENT_CLASSES = [AsyncMosquitto, TrueAsyncMosquitto]
 
 
+@pytest.fixture(params=["asyncio", "uvloop"])
+def event_loop_policy(request):
+    if request.param == "uvloop":
+        return pytest.importorskip("uvloop").EventLoopPolicy()
+    return asyncio.DefaultEventLoopPolicy()
+
+
 @pytest.fixture(scope="session")
 def client_factory():
-    def _factory(cls):
-        client = cls()
+    def _factory(cls, **kwargs):
+        client = cls(**kwargs)
         if c.USERNAME or c.PASSWORD:
             client.mosq.username_pw_set(c.USERNAME, c.PASSWORD)
         return client
@@ -46,6 +61,99 @@ async def test_pub_sub(cls, client_factory):
         assert [msg.payload for msg in messages] == [b"0", b"1", b"2"]
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+@pytest.mark.parametrize("qos", [0, 1])
+async def test_publish_many(cls, qos, client_factory):
+    count = 10
+
+    async with client_factory(cls) as client:
+        await client.connect(c.HOST, c.PORT)
+        await client.subscribe("test/many", qos=1)
+
+        mids = await client.publish_many(
+            ("test/many", str(i), qos, False) for i in range(count)
+        )
+        assert len(set(mids)) == count
+
+        async def recv():
+            messages = []
+            async for msg in client.read_messages():
+                messages.append(msg)
+                if len(messages) == count:
+                    break
+            return messages
+
+        async with asyncio.timeout(1):
+            messages = await client.loop.create_task(recv())
+        assert [msg.payload for msg in messages] == [
+            str(i).encode() for i in range(count)
+        ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+async def test_publish_pipelined(cls, client_factory):
+    count = 10
+
+    async with client_factory(cls, max_inflight=2) as client:
+        await client.connect(c.HOST, c.PORT)
+        await client.subscribe("test/pipelined", qos=1)
+
+        async with asyncio.timeout(1):
+            futures = [
+                await client.publish_pipelined("test/pipelined", str(i), qos=1)
+                for i in range(count)
+            ]
+            assert len(client._inflight) <= 2
+            mids = await asyncio.gather(*futures)
+        assert len(set(mids)) == count
+        assert not client._inflight
+
+        mid = client.publish_nowait("test/pipelined", "last", ack=False)
+        assert isinstance(mid, int)
+
+        async def recv():
+            messages = []
+            async for msg in client.read_messages():
+                messages.append(msg)
+                if len(messages) == count + 1:
+                    break
+            return messages
+
+        async with asyncio.timeout(1):
+            messages = await client.loop.create_task(recv())
+        assert [msg.payload for msg in messages] == [
+            str(i).encode() for i in range(count)
+        ] + [b"last"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+async def test_publish_pipelined_disconnect(cls, client_factory):
+    async with client_factory(cls, max_inflight=2) as client:
+        await client.connect(c.HOST, c.PORT)
+        futures = [
+            await client.publish_pipelined("test/pipelined", str(i), qos=1)
+            for i in range(2)
+        ]
+        # waits for the window unless the acks are already in
+        blocked = client.loop.create_task(
+            client.publish_pipelined("test/pipelined", "2", qos=1)
+        )
+        await asyncio.sleep(0)
+        await client.disconnect()
+
+        async with asyncio.timeout(1):
+            results = await asyncio.gather(*futures, blocked, return_exceptions=True)
+            if asyncio.isfuture(results[-1]):
+                # got a slot before the disconnect, its own future settles too
+                await asyncio.wait({results[-1]})
+        assert not client._inflight
+        for result in results[:-1]:
+            assert isinstance(result, (int, ConnectionError))
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize("cls", CLIENT_CLASSES)
 async def test_multi_connect(cls, client_factory):
@@ -54,3 +162,176 @@ async def test_multi_connect(cls, client_factory):
         rc1 = await client.connect(c.HOST, c.PORT)
         rc2 = await task
         assert rc1 == rc2 == ConnackCode.ACCEPTED
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+@pytest.mark.parametrize("resolve", [True, False])
+async def test_connect_resolve(cls, resolve, client_factory):
+    async with client_factory(cls) as client:
+        rc = await client.connect(c.HOST, c.PORT, timeout=1, resolve=resolve)
+        assert rc == ConnackCode.ACCEPTED
+        await client.subscribe("test/resolve", qos=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+async def test_connect_next_address(cls, client_factory, monkeypatch):
+    async def _resolve_host(host, port):
+        return ["bad.invalid", host]
+
+    async def _connect_addr(addr, *args):
+        tried.append(addr)
+        if addr == "bad.invalid":
+            raise ConnectionError("refused")
+        return await connect_addr(addr, *args)
+
+    tried = []
+    monkeypatch.setattr(aio, "resolve_host", _resolve_host)
+    async with client_factory(cls) as client:
+        connect_addr = client._connect_addr
+        monkeypatch.setattr(client, "_connect_addr", _connect_addr)
+        rc = await client.connect(c.HOST, c.PORT, timeout=1, resolve=True)
+        assert rc == ConnackCode.ACCEPTED
+        assert tried == ["bad.invalid", c.HOST]
+
+
+@pytest.mark.asyncio
+async def test_resolve_host_cache(monkeypatch):
+    addrs = await resolve_host(c.HOST, c.PORT)
+    assert addrs
+    assert await resolve_host(c.HOST, c.PORT) == addrs
+    assert await resolve_host(c.HOST, c.PORT, ttl=0) == addrs
+    monkeypatch.setattr(aio, "DNS_CACHE_SIZE", 1)
+    await resolve_host(c.HOST, c.PORT + 1)
+    assert list(aio._dns_cache) == [(c.HOST, c.PORT + 1)]
+
+
+def _msg(topic, payload):
+    return SimpleNamespace(topic=topic, payload=payload)
+
+
+@pytest.mark.parametrize(
+    "policy,expected",
+    [
+        (OverflowPolicy.DROP_OLDEST, [2, 3]),
+        (OverflowPolicy.DROP_NEWEST, [0, 1]),
+        (OverflowPolicy.BLOCK, [0, 1, 2, 3]),
+    ],
+)
+def test_message_queue_overflow(policy, expected):
+    queue = MessageQueue(2, policy)
+    for i in range(4):
+        queue.put_nowait(_msg("test", i))
+    queue.put_nowait(None)
+    messages = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [msg.payload for msg in messages[:-1]] == expected
+    assert messages[-1] is None
+    assert queue.dropped == 4 - len(expected)
+
+
+def test_message_queue_conflate():
+    queue = MessageQueue(2, OverflowPolicy.CONFLATE)
+    for topic, value in [("a", 1), ("b", 1), ("b", 2), ("c", 1)]:
+        queue.put_nowait(_msg(topic, value))
+    messages = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [(msg.topic, msg.payload) for msg in messages] == [("b", 2), ("c", 1)]
+    assert queue.conflated == 1
+    assert queue.dropped == 1
+
+
+def test_message_queue_on_space():
+    calls = []
+    queue = MessageQueue(2, OverflowPolicy.BLOCK, on_space=lambda: calls.append(1))
+    for i in range(3):
+        queue.put_nowait(_msg("test", i))
+    assert queue.full()
+    queue.get_nowait()
+    assert not calls
+    queue.get_nowait()
+    assert calls == [1]
+
+
+@pytest.mark.asyncio
+async def test_deprecated_buffer_args():
+    with pytest.warns(DeprecationWarning):
+        AsyncMosquitto(buffer_size=100, flush_interval=0.1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+async def test_max_queued_messages(cls, client_factory):
+    async with client_factory(
+        cls, max_queued_messages=1, overflow=OverflowPolicy.CONFLATE
+    ) as client:
+        await client.connect(c.HOST, c.PORT)
+        await client.subscribe("test/conflate", qos=1)
+        for i in range(3):
+            await client.publish("test/conflate", str(i), qos=1)
+
+        async with asyncio.timeout(1):
+            while client.messages.conflated < 2:
+                await asyncio.sleep(0.01)
+        msg = client.messages.get_nowait()
+        assert msg.payload == b"2"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cls", CLIENT_CLASSES)
+async def test_stats(cls, client_factory):
+    async with client_factory(cls) as client:
+        await client.connect(c.HOST, c.PORT)
+        await client.subscribe("test/stats", qos=1)
+        for i in range(3):
+            await client.publish("test/stats", str(i), qos=1)
+
+        async with asyncio.timeout(1):
+            while client.messages.qsize() < 3:
+                await asyncio.sleep(0.01)
+        stats = client.stats()
+        assert stats["messages_out"] == [0, 3, 0]
+        assert stats["messages_in"] == [0, 3, 0]
+        assert stats["publish_acks"] == 3
+        assert stats["queue_depth"] == 3
+        assert stats["pending_publishes"] == 0
+        assert stats["pending_subscribes"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_packets", [1, 1000])
+async def test_true_async_max_packets(max_packets, client_factory):
+    count = 100
+
+    async with client_factory(TrueAsyncMosquitto, max_packets=max_packets) as client:
+        await client.connect(c.HOST, c.PORT)
+        await client.subscribe("test/drain", qos=0)
+        await client.publish_many(
+            ("test/drain", str(i), 0, False) for i in range(count)
+        )
+
+        async def recv():
+            messages = []
+            async for msg in client.read_messages():
+                messages.append(msg)
+                if len(messages) == count:
+                    break
+            return messages
+
+        async with asyncio.timeout(1):
+            messages = await client.loop.create_task(recv())
+        assert [msg.payload for msg in messages] == [
+            str(i).encode() for i in range(count)
+        ]
+
+
+@pytest.mark.asyncio
+async def test_true_async_misc_schedule(client_factory):
+    async with client_factory(TrueAsyncMosquitto) as client:
+        await client.connect(c.HOST, c.PORT, keepalive=30)
+        assert client.mosq.keepalive == 30
+        # no wakeups until a PINGREQ is due
+        assert client._misc_handle.when() - client.loop.time() > 29
+
+        await client.subscribe("test/misc", qos=1)
+        await client.publish("test/misc", "1", qos=1)
+        assert not client.mosq.want_write()
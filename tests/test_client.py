@@ -1,4 +1,7 @@
+import array
+import logging
 import threading
+from types import SimpleNamespace
 import time
 import errno
 from ctypes.util import find_library
@@ -6,7 +9,8 @@ import ctypes as C
 
 import pytest
 
-from pymosquitto.client import Mosquitto, call
+from pymosquitto.bindings import MQTTMessageStruct
+from pymosquitto.client import Method, Mosquitto, MosquittoError, MQTTMessageView, call
 from pymosquitto.constants import ConnackCode
 
 import constants as c
@@ -20,6 +24,56 @@ def test_call():
     assert ret == len(text)
 
 
+def _baseline_call(method, ptr, *args, logger=None):
+    # what the descriptor did before methods were compiled
+    return Mosquitto.call(SimpleNamespace(_logger=logger), method._func, ptr, *args)
+
+
+def test_method_encode_and_decode():
+    setenv = Method(C.c_int, libc.setenv, C.c_char_p, C.c_char_p, C.c_int)
+    getenv = Method(C.c_char_p, libc.getenv, C.c_char_p)
+    name = b"PYMOSQUITTO_TEST"
+
+    assert setenv.compile(name)("value", 1) == 0
+    assert getenv.compile(name)() == _baseline_call(getenv, name) == "value"
+    assert setenv.compile(name)(b"bytes", 1) == 0
+    assert getenv.compile(name)() == "bytes"
+    assert getenv.compile(b"PYMOSQUITTO_MISSING")() is None
+
+    # a string after a non-string argument, at argtypes index 2
+    snprintf = Method(C.c_int, libc.snprintf, C.c_void_p, C.c_size_t, C.c_char_p)
+    buf = C.create_string_buffer(8)
+    assert snprintf.compile(C.addressof(buf), logging.getLogger())(8, "topic") == 5
+    assert buf.value == b"topic"
+
+    strtol = Method(C.c_long, libc.strtol, C.c_char_p, C.c_void_p, C.c_int)
+    assert strtol.compile(b"42")(None, 10) == _baseline_call(strtol, b"42", None, 10)
+
+
+def test_method_error():
+    setenv = Method(C.c_int, libc.setenv, C.c_char_p, C.c_char_p, C.c_int)
+    # an empty name is rejected with -1
+    with pytest.raises(MosquittoError) as compiled:
+        setenv.compile(b"")("value", 1)
+    with pytest.raises(MosquittoError) as baseline:
+        _baseline_call(setenv, b"", "value", 1)
+    assert compiled.value.code == baseline.value.code
+    unchecked = Method(
+        C.c_int, libc.setenv, C.c_char_p, C.c_char_p, C.c_int, check=False
+    )
+    assert unchecked.compile(b"")("value", 1) == -1
+
+
+def test_method_logger(caplog):
+    logger = logging.getLogger("test_method")
+    getenv = Method(C.c_char_p, libc.getenv, C.c_char_p)
+    with caplog.at_level(logging.DEBUG, logger="test_method"):
+        getenv.compile(b"PATH", logger)()
+        _baseline_call(getenv, b"PATH", logger=logger)
+    compiled, baseline = [r.getMessage() for r in caplog.records]
+    assert compiled == baseline == "CALL: getenv(b'PATH',)"
+
+
 def test_call_error():
     with pytest.raises(OSError) as e:
         call(libc.read, C.byref(C.c_int()), use_errno=True)
@@ -113,3 +167,286 @@ def test_on_message(client):
 
     assert is_recv.wait(1)
     assert udata.msg.payload == b"123"
+
+
+def test_on_message_view(client_factory):
+    def _on_connect(client, userdata, rc):
+        is_connected.set()
+
+    def _on_message(client, userdata, msg):
+        userdata.view = msg
+        userdata.payload = bytes(msg.payload)
+        userdata.msg = msg.detach()
+        is_recv.set()
+
+    is_connected = threading.Event()
+    is_recv = threading.Event()
+    client = client_factory(message_view=True)
+    client.on_connect = _on_connect
+    client.on_message = _on_message
+    client.connect(c.HOST, c.PORT)
+    client.loop_start()
+    try:
+        assert is_connected.wait(1)
+        client.subscribe("test", 1)
+        client.publish("test", "123", qos=1)
+        assert is_recv.wait(1)
+        udata = client.userdata()
+        assert udata.payload == b"123"
+        assert udata.msg.topic == "test"
+        assert udata.msg.payload == b"123"
+        with pytest.raises(ValueError):
+            udata.view.payload
+    finally:
+        client.disconnect(strict=False)
+
+
+def test_message_view_derived_payload():
+    payload = C.create_string_buffer(b"123", 3)
+    msg = MQTTMessageStruct(
+        mid=1, topic=b"test", payload=C.cast(payload, C.c_void_p), payloadlen=3
+    )
+    view = MQTTMessageView(C.pointer(msg))
+    part = view.payload[1:]
+    with pytest.warns(RuntimeWarning):
+        view.release()
+    part.release()
+
+
+def test_on_messages(client_factory):
+    count = 5
+
+    def _on_connect(client, userdata, rc):
+        client.subscribe("test/batch", 1)
+
+    def _on_subscribe(client, userdata, mid, count, granted_qos):
+        is_sub.set()
+
+    def _on_messages(client, userdata, batch):
+        userdata.batches.append(batch)
+        if sum(len(b) for b in userdata.batches) >= count:
+            is_recv.set()
+
+    is_sub = threading.Event()
+    is_recv = threading.Event()
+    client = client_factory(batch_size=3, batch_latency=0.01)
+    client.user_data_set(SimpleNamespace(batches=[]))
+    client.on_connect = _on_connect
+    client.on_subscribe = _on_subscribe
+    client.on_messages = _on_messages
+    client.threaded_set(True)
+    client.connect(c.HOST, c.PORT)
+    thread = threading.Thread(target=client.loop_forever)
+    thread.start()
+    try:
+        assert is_sub.wait(1)
+        for i in range(count):
+            client.publish("test/batch", str(i), qos=1)
+        assert is_recv.wait(1)
+        batches = client.userdata().batches
+        assert max(len(b) for b in batches) <= 3
+        assert [m.payload for b in batches for m in b] == [
+            str(i).encode() for i in range(count)
+        ]
+    finally:
+        client.disconnect(strict=False)
+        thread.join(1)
+    assert not thread.is_alive()
+
+
+def test_on_messages_loop_start(client):
+    def _on_message(client, userdata, msg):
+        pass
+
+    def _on_messages(client, userdata, batch):
+        batches.append(batch)
+        is_recv.set()
+
+    batches = []
+    is_recv = threading.Event()
+    client.on_message = _on_message
+    client.on_messages = _on_messages
+    client.subscribe("test/batch-timer", 1)
+    time.sleep(0.1)
+    client.publish("test/batch-timer", "a", qos=1)
+    client.publish("test/batch-timer", "b", qos=1)
+    # far below batch_size, so only the flusher delivers the batch
+    assert is_recv.wait(1)
+    time.sleep(0.1)
+    assert [m.payload for b in batches for m in b] == [b"a", b"b"]
+    client.on_messages = None
+    assert client.on_message is _on_message
+
+
+def test_on_messages_serialized(client_factory):
+    count = 200
+
+    def _on_messages(client, userdata, batch):
+        nonlocal delivering
+        assert not delivering
+        delivering = True
+        # slow enough for the flusher and the network thread to overlap
+        time.sleep(0.002)
+        received.extend(int(m.payload) for m in batch)
+        delivering = False
+        if len(received) >= count:
+            is_recv.set()
+
+    delivering = False
+    received = []
+    is_recv = threading.Event()
+    client = client_factory(batch_size=7, batch_latency=0.001)
+    client.on_messages = _on_messages
+    client.connect(c.HOST, c.PORT)
+    client.loop_start()
+    try:
+        client.subscribe("test/batch-order", 1)
+        time.sleep(0.1)
+        for i in range(count):
+            client.publish("test/batch-order", str(i), qos=1)
+        assert is_recv.wait(5)
+        assert received == list(range(count))
+        flushers = [
+            th for th in threading.enumerate() if th.name == "pymosquitto-batch-flusher"
+        ]
+        assert len(flushers) == 1
+    finally:
+        client.disconnect(strict=False)
+        client.loop_stop(False)
+
+
+def test_prepare_publish(client):
+    def _on_message(client, userdata, msg):
+        messages.append(msg)
+        if len(messages) == 2:
+            is_recv.set()
+
+    messages = []
+    is_recv = threading.Event()
+    client.on_message = _on_message
+    client.subscribe("test/prepared", 1)
+    handle = client.prepare_publish("test/prepared", qos=1)
+    mids = [handle.send("1"), handle.send(b"2")]
+    assert mids[0] != mids[1]
+    assert is_recv.wait(1)
+    assert [msg.payload for msg in messages] == [b"1", b"2"]
+    assert {msg.topic for msg in messages} == {"test/prepared"}
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        bytearray(b"123"),
+        memoryview(b"0123")[1:],
+        memoryview(bytearray(b"01234"))[1:4],
+        array.array("B", b"123"),
+    ],
+)
+def test_publish_buffer(client, payload):
+    def _on_message(client, userdata, msg):
+        userdata.msg = msg
+        is_recv.set()
+
+    is_recv = threading.Event()
+    client.on_message = _on_message
+    client.subscribe("test/buffer", 1)
+    client.publish("test/buffer", payload, qos=1)
+    assert is_recv.wait(1)
+    assert client.userdata().msg.payload == b"123"
+
+
+def test_publish_reused_buffer(client):
+    def _on_message(client, userdata, msg):
+        messages.append(msg.payload)
+        if len(messages) == 2:
+            is_recv.set()
+
+    messages = []
+    is_recv = threading.Event()
+    client.on_message = _on_message
+    client.subscribe("test/buffer", 1)
+    buf = bytearray(16)
+    view = memoryview(buf)
+    handle = client.prepare_publish("test/buffer", qos=1)
+    for payload in (b"first", b"2nd"):
+        buf[: len(payload)] = payload
+        handle.send(view[: len(payload)])
+    assert is_recv.wait(1)
+    assert messages == [b"first", b"2nd"]
+
+
+def test_publish_non_contiguous(client):
+    with pytest.raises(ValueError):
+        client.publish("test/buffer", memoryview(b"123456")[::2])
+
+
+def test_publish_many(client):
+    def _on_message(client, userdata, msg):
+        messages.append(msg.payload)
+        if len(messages) == 3:
+            is_recv.set()
+
+    messages = []
+    is_recv = threading.Event()
+    client.on_message = _on_message
+    client.subscribe("test/many", 1)
+    mids = client.publish_many(("test/many", str(i), 1, False) for i in range(3))
+    assert len(set(mids)) == 3
+    assert is_recv.wait(1)
+    assert messages == [b"0", b"1", b"2"]
+
+
+def test_stats(client):
+    def _on_message(client, userdata, msg):
+        messages.append(msg)
+        if len(messages) == 3:
+            is_recv.set()
+
+    messages = []
+    is_recv = threading.Event()
+    client.on_message = _on_message
+    client.on_publish = lambda *_: None
+    client.subscribe("test/stats", 1)
+    client.publish("test/stats", "12", qos=1)
+    client.prepare_publish("test/stats", qos=1).send(b"345")
+    client.publish_many([("test/stats", b"6", 1, False)])
+    assert is_recv.wait(1)
+
+    stats = client.stats()
+    assert stats["messages_out"] == [0, 3, 0]
+    assert stats["bytes_out"] == [0, 6, 0]
+    assert stats["messages_in"] == [0, 3, 0]
+    assert stats["bytes_in"] == [0, 6, 0]
+    assert stats["connects"] == 1
+    assert stats["reconnects"] == 0
+    assert stats["callbacks"]["message"] == 3
+    assert stats["callback_time"] > 0
+    # the snapshot doesn't change with the client
+    client.publish("test/stats", "7")
+    assert stats["messages_out"] == [0, 3, 0]
+
+
+def test_stats_count_events_once(client_factory):
+    def _on_connect(client, userdata, rc):
+        calls.append("v3")
+
+    def _on_connect_v5(client, userdata, rc, flags, props):
+        calls.append("v5")
+        is_connected.set()
+
+    calls = []
+    is_connected = threading.Event()
+    client = client_factory()
+    client.on_connect = _on_connect
+    client.on_connect_v5 = _on_connect_v5
+    client.connect(c.HOST, c.PORT)
+    client.loop_start()
+    try:
+        assert is_connected.wait(1)
+        assert calls == ["v3", "v5"]
+        stats = client.stats()
+        assert stats["connects"] == 1
+        assert stats["callbacks"]["connect"] == 2
+    finally:
+        client.disconnect(strict=False)
+        client.loop_stop(False)
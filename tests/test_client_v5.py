@@ -1,9 +1,11 @@
+import gc
+import resource
 import threading
 
 import pytest
 
 from pymosquitto.constants import ConnackCode, ProtocolVersion, MQTT5PropertyID
-from pymosquitto.client import PropertyFactory
+from pymosquitto.client import PropertyFactory, PropertyList
 
 import constants as c
 
@@ -50,3 +52,114 @@ def test_v5_props(client):
 
     assert is_recv.wait(1)
     assert client.userdata().prop.value.i32 == test_value
+
+
+def test_v5_props_view(client):
+    def _on_message(client, userdata, msg, props):
+        userdata.user_properties = props.user_properties
+        userdata.has_expiry = MQTT5PropertyID.MESSAGE_EXPIRY_INTERVAL in props
+        userdata.props = props.detach()
+        is_recv.set()
+
+    is_recv = threading.Event()
+    client.on_message_v5 = _on_message
+    client.subscribe("test/props", 1)
+
+    prop = PropertyFactory.STRING_PAIR(MQTT5PropertyID.USER_PROPERTY, b"key", b"value")
+    client.publish("test/props", "123", qos=1, props=prop)
+
+    assert is_recv.wait(1)
+    userdata = client.userdata()
+    assert userdata.user_properties == [("key", "value")]
+    assert not userdata.has_expiry
+    assert userdata.props[MQTT5PropertyID.USER_PROPERTY] == ("key", "value")
+    assert userdata.props.get(MQTT5PropertyID.CONTENT_TYPE) is None
+
+
+def test_property_list(client):
+    def _on_message(client, userdata, msg, props):
+        userdata.props = props.detach()
+        is_recv.set()
+
+    is_recv = threading.Event()
+    client.on_message_v5 = _on_message
+    client.subscribe("test/props", 1)
+
+    with PropertyList(
+        {
+            MQTT5PropertyID.CONTENT_TYPE: "application/json",
+            MQTT5PropertyID.USER_PROPERTY: [("a", "1"), ("b", "2")],
+        }
+    ) as props:
+        client.publish("test/props", "{}", qos=1, props=props)
+        assert is_recv.wait(1)
+    assert not props
+
+    received = client.userdata().props
+    assert received[MQTT5PropertyID.CONTENT_TYPE] == "application/json"
+    assert received.user_properties == [("a", "1"), ("b", "2")]
+    assert len(received) == len(list(received)) == 2
+    assert len(received.items()) == 3
+
+
+def test_property_list_cached():
+    items = [(MQTT5PropertyID.USER_PROPERTY, ("source", "test"))]
+    props = PropertyList.cached(items)
+    assert props is PropertyList.cached(items)
+    props.close()
+    assert props
+    with pytest.raises(TypeError):
+        props.add(MQTT5PropertyID.CONTENT_TYPE, "text/plain")
+
+
+@pytest.mark.skipif(not c.SLOW, reason="set SLOW_TESTS=1 to run")
+def test_property_list_leak(client):
+    count = 1_000_000
+    batch = 10_000
+    published = 0
+    cond = threading.Condition()
+
+    def _on_publish(client, userdata, mid):
+        nonlocal published
+        with cond:
+            published += 1
+            cond.notify()
+
+    def _publish(n):
+        for i in range(n):
+            with PropertyList(
+                {MQTT5PropertyID.USER_PROPERTY: ("seq", str(i))}
+            ) as props:
+                client.publish("test/leak", b"x", props=props)
+            # keeps the outgoing queue short, so only a leak can grow the RSS
+            if i % batch == batch - 1:
+                with cond:
+                    assert cond.wait_for(lambda: published >= i + 1 - batch, 5)
+
+    client.on_publish = _on_publish
+    _publish(batch * 10)
+    # late acks of the warm-up would be counted for the next round
+    with cond:
+        assert cond.wait_for(lambda: published >= batch * 10, 5)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    published = 0
+    _publish(count)
+    # ru_maxrss is in KiB, a leak of the smallest property list would be 30+ MiB
+    assert resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss < 8 * 1024
+
+
+def test_will_set_v5_props(client_factory):
+    client = client_factory(protocol=ProtocolVersion.MQTTv5)
+    props = PropertyList({MQTT5PropertyID.CONTENT_TYPE: "text/plain"})
+    client.will_set_v5("test/will", 4, b"gone", 1, False, props)
+    # the client keeps its own copy, so the list can be freed
+    del props
+    gc.collect()
+    # replacing the will frees the previous copy
+    props = PropertyFactory.STRING(MQTT5PropertyID.CONTENT_TYPE, b"text/plain")
+    client.will_set_v5("test/will", 4, b"gone", 1, False, props)
+    props.close()
+    client.will_set_v5("test/will", 4, b"gone", 1, False, None)
+    client.will_clear()
+    client.connect(c.HOST, c.PORT)
+    client.disconnect()
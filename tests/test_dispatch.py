@@ -0,0 +1,143 @@
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pymosquitto.dispatch import AsyncKeyedExecutor, KeyedExecutor
+
+
+def _msgs(count, keys=10):
+    return [SimpleNamespace(topic=f"test/{i % keys}", payload=i) for i in range(count)]
+
+
+def test_keyed_executor_order():
+    received = {}
+    lock = threading.Lock()
+
+    def handler(msg):
+        time.sleep(random.random() / 1000)
+        with lock:
+            received.setdefault(msg.topic, []).append(msg.payload)
+
+    with KeyedExecutor(handler, max_workers=8) as executor:
+        for msg in _msgs(1000):
+            executor.submit(msg)
+
+    assert sum(len(payloads) for payloads in received.values()) == 1000
+    assert all(payloads == sorted(payloads) for payloads in received.values())
+    stats = executor.stats()
+    assert len(stats) == 10
+    assert all(s.processed == 100 and s.depth == 0 for s in stats.values())
+
+
+def test_keyed_executor_stats():
+    release = threading.Event()
+    errors = []
+
+    def handler(msg):
+        release.wait()
+        raise ValueError(msg.payload)
+
+    with KeyedExecutor(
+        handler, max_workers=2, on_error=lambda msg, e: errors.append(e)
+    ) as executor:
+        for msg in _msgs(3, keys=1):
+            executor.submit(msg)
+        time.sleep(0.01)
+        stats = executor.stats()["test/0"]
+        assert stats.depth == 3
+        assert stats.lag > 0
+        release.set()
+
+    stats = executor.stats()["test/0"]
+    assert stats.errors == len(errors) == 3
+    assert stats.depth == 0
+
+
+def test_keyed_executor_max_idle():
+    with KeyedExecutor(lambda msg: None, max_workers=4, max_idle=2) as executor:
+        for msg in _msgs(100):
+            executor.submit(msg)
+        executor.join()
+        assert len(executor.stats()) == 2
+        executor.submit(SimpleNamespace(topic="test/0", payload=0))
+
+
+@pytest.mark.asyncio
+async def test_async_keyed_executor_order():
+    received = {}
+    running = 0
+    max_running = 0
+
+    async def handler(msg):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(random.random() / 1000)
+        running -= 1
+        received.setdefault(msg.topic, []).append(msg.payload)
+
+    executor = AsyncKeyedExecutor(handler, concurrency=4)
+    for msg in _msgs(1000):
+        executor.submit(msg)
+    await executor.join()
+
+    assert max_running == 4
+    assert sum(len(payloads) for payloads in received.values()) == 1000
+    assert all(payloads == sorted(payloads) for payloads in received.values())
+
+
+def _failing_on_error(msg, e):
+    raise RuntimeError("on_error failed")
+
+
+def test_keyed_executor_on_error_raises():
+    def handler(msg):
+        raise ValueError(msg.payload)
+
+    with KeyedExecutor(handler, max_workers=2, on_error=_failing_on_error) as executor:
+        for msg in _msgs(10, keys=2):
+            executor.submit(msg)
+        assert executor.join(1)
+
+    stats = executor.stats()
+    assert sum(s.errors for s in stats.values()) == 10
+    assert all(s.depth == 0 for s in stats.values())
+
+
+@pytest.mark.asyncio
+async def test_async_keyed_executor_on_error_raises():
+    async def handler(msg):
+        raise ValueError(msg.payload)
+
+    executor = AsyncKeyedExecutor(handler, on_error=_failing_on_error)
+    for msg in _msgs(10, keys=2):
+        executor.submit(msg)
+    await asyncio.wait_for(executor.join(), 1)
+
+    stats = executor.stats()
+    assert sum(s.errors for s in stats.values()) == 10
+    assert all(s.depth == 0 for s in stats.values())
+
+
+def test_keyed_executor_on_message(client):
+    count = 10
+    received = []
+    done = threading.Event()
+
+    def handler(msg):
+        received.append(msg.payload)
+        if len(received) == count:
+            done.set()
+
+    with KeyedExecutor(handler) as executor:
+        client.on_message = executor.on_message
+        client.subscribe("test/dispatch", 1)
+        for i in range(count):
+            client.publish("test/dispatch", str(i), qos=1)
+        assert done.wait(1)
+
+    assert received == [str(i).encode() for i in range(count)]
@@ -46,6 +46,55 @@ def test_not_matching(sub, topic):
     assert not h.topic_matches_sub(sub, topic)
 
 
+SUBS = [
+    "#",
+    "+",
+    "/#",
+    "+/+",
+    "a",
+    "a/",
+    "a/#",
+    "a/+",
+    "a/+/#",
+    "a/b",
+    "+/b",
+    "a/b/#",
+    "a/#/b",
+    "a/b+",
+    "a/#b",
+    "$SYS/#",
+    "$SYS/+",
+    "+/SYS",
+]
+TOPICS = [
+    "a",
+    "a/",
+    "/a",
+    "a/b",
+    "a/b/c",
+    "a//b",
+    "b/b",
+    "$SYS",
+    "$SYS/a",
+    "/",
+    "a/+",
+    "a/#",
+]
+
+
+@pytest.mark.parametrize("sub", SUBS)
+def test_matching_libmosq(sub):
+    expected = [h.libmosq_topic_matches_sub(sub, topic) for topic in TOPICS]
+    assert [h.topic_matches_sub(sub, topic) for topic in TOPICS] == expected
+    assert h.topics_match_sub(sub, TOPICS) == expected
+
+
+@pytest.mark.parametrize("topic", TOPICS)
+def test_sub_matches_topics(topic):
+    expected = [h.libmosq_topic_matches_sub(sub, topic) for sub in SUBS]
+    assert h.sub_matches_topics(SUBS, topic) == expected
+
+
 def test_topic_matcher():
     def a():
         pass
@@ -65,6 +114,47 @@ def test_topic_matcher():
     assert list(matcher.find("c/b/a")) == [cba]
 
 
+def test_topic_matcher_wildcards():
+    def plus():
+        pass
+
+    def hash_():
+        pass
+
+    def sys_():
+        pass
+
+    matcher = h.TopicMatcher()
+    matcher.set_topic_callback("+/b", plus)
+    matcher.set_topic_callback("#", hash_)
+    matcher.set_topic_callback("$SYS/#", sys_)
+
+    assert list(matcher.find("a/b")) == [plus, hash_]
+    assert list(matcher.find("a")) == [hash_]
+    assert list(matcher.find("$SYS/b")) == [sys_]
+    assert list(matcher.find("$SYS")) == [sys_]
+
+
+def test_topic_matcher_cache_invalidation():
+    def a():
+        pass
+
+    def b():
+        pass
+
+    matcher = h.TopicMatcher(cache_size=2)
+    matcher.set_topic_callback("a/+", a)
+    assert list(matcher.find("a/b")) == [a]
+    matcher.set_topic_callback("a/b", b)
+    assert list(matcher.find("a/b")) == [a, b]
+    matcher.set_topic_callback("a/+", b)
+    assert list(matcher.find("a/b")) == [b, b]
+    matcher.set_topic_callback("a/+", None)
+    assert list(matcher.find("a/b")) == [b]
+    matcher.set_topic_callback("a/b", None)
+    assert list(matcher.find("a/b")) == []
+
+
 def test_csignal():
     q = queue.Queue()
 
@@ -0,0 +1,63 @@
+import os
+import signal
+import time
+
+from pymosquitto.pool import ConsumerPool
+
+import constants as c
+
+TOPIC = "test/pool"
+
+
+def _setup(client):
+    if c.USERNAME or c.PASSWORD:
+        client.username_pw_set(c.USERNAME, c.PASSWORD)
+
+
+def _handler(client, userdata, msg):
+    pass
+
+
+def _wait(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_consumer_pool(client):
+    count = 100
+
+    with ConsumerPool(
+        _handler, TOPIC, "pool", workers=2, host=c.HOST, port=c.PORT, setup=_setup
+    ) as pool:
+        assert pool.subscription == f"$share/pool/{TOPIC}"
+        # the workers don't report their subscriptions, give them time to connect
+        time.sleep(1)
+        for i in range(count):
+            client.publish(TOPIC, str(i), qos=1)
+        _wait(lambda: pool.messages == count)
+        stats = pool.stats()
+        assert len(stats) == 2
+        assert all(s.alive for s in stats)
+        assert sum(s.messages for s in stats) == count
+
+
+def test_consumer_pool_restart():
+    with ConsumerPool(
+        _handler,
+        TOPIC,
+        "pool",
+        workers=1,
+        host=c.HOST,
+        port=c.PORT,
+        setup=_setup,
+        restart_delay=0,
+    ) as pool:
+        pid = pool.stats()[0].pid
+        os.kill(pid, signal.SIGKILL)
+        _wait(lambda: pool.check() == 1)
+        stats = pool.stats()[0]
+        assert stats.alive
+        assert stats.restarts == 1
+        assert stats.pid != pid
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from pymosquitto.profiler import CallbackProfiler, Histogram
+
+import constants as c
+
+
+def test_histogram():
+    hist = Histogram()
+    for value in range(1, 10001):
+        hist.record(value)
+    assert hist.total == 10000
+    assert hist.max == 10000
+    assert hist.percentile(50) == pytest.approx(5000, rel=0.01)
+    assert hist.percentile(99) == pytest.approx(9900, rel=0.01)
+    assert hist.percentile(100) == 10000
+
+
+def test_sample_rate():
+    profiler = CallbackProfiler(sample_rate=10)
+    assert sum(profiler.sample() for _ in range(100)) == 10
+    with pytest.raises(ValueError):
+        CallbackProfiler(sample_rate=0)
+
+
+@pytest.mark.parametrize("message_view", [False, True])
+def test_profiler(client_factory, message_view):
+    def _on_message(client, userdata, msg):
+        messages.append(bytes(msg.payload))
+        if len(messages) == count:
+            is_recv.set()
+
+    count = 10
+    messages = []
+    is_connected = threading.Event()
+    is_recv = threading.Event()
+    client = client_factory(message_view=message_view)
+    profiler = CallbackProfiler(sample_rate=2).attach(client)
+    profiler.calibrate(number=100)
+    client.on_connect = lambda *_: is_connected.set()
+    client.on_message = _on_message
+    client.connect(c.HOST, c.PORT)
+    client.loop_start()
+    try:
+        assert is_connected.wait(1)
+        client.subscribe("test/profiler", 1)
+        for i in range(count):
+            client.publish("test/profiler", str(i), qos=1)
+        assert is_recv.wait(1)
+    finally:
+        client.disconnect(strict=False)
+
+    assert messages == [str(i).encode() for i in range(count)]
+    # the sampled invocations are counted like the others
+    assert client.stats()["messages_in"] == [0, count, 0]
+    report = profiler.report()
+    assert "message;trampoline (est.)" in report
+    assert "message;handler;" in report
+    stacks = profiler.collapsed().splitlines()
+    frames = {line.rsplit(" ", 1)[0] for line in stacks}
+    assert "pymosquitto;on_message;convert" in frames
+    assert "pymosquitto;on_message;trampoline (est.)" in frames
+    assert all(int(line.rsplit(" ", 1)[1]) >= 0 for line in stacks)
+
+    profiler.detach(client)
+    assert client._profiler is None
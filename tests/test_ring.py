@@ -0,0 +1,102 @@
+import functools
+import multiprocessing as mp
+import time
+
+import pytest
+
+from pymosquitto.client import MQTTMessage
+from pymosquitto.ring import RingDispatcher
+
+
+def _handler(queue, msg):
+    queue.put((msg.topic, msg.payload, msg.qos))
+
+
+@pytest.fixture
+def ctx():
+    return mp.get_context("fork")
+
+
+def test_ring_dispatch(ctx):
+    queue = ctx.SimpleQueue()
+    count = 1000
+
+    # a small ring makes the producer wait for the workers
+    with RingDispatcher(
+        functools.partial(_handler, queue), workers=3, slots=4, context=ctx
+    ) as ring:
+        for i in range(count):
+            assert ring.put(MQTTMessage(i, f"test/{i % 5}", str(i).encode(), 1, False))
+
+    received = [queue.get() for _ in range(count)]
+    assert sorted(int(payload) for _, payload, _ in received) == list(range(count))
+    assert {topic for topic, _, _ in received} == {f"test/{i}" for i in range(5)}
+    assert ring.dispatched == count
+
+
+def test_ring_drop(ctx):
+    ring = RingDispatcher(_handler, workers=0, slots=1, slot_size=64, context=ctx)
+    ring.start()
+    try:
+        assert not ring.put(MQTTMessage(0, "test", b"x" * 64, 0, False))
+        assert ring.put(MQTTMessage(0, "test", b"x", 0, False))
+        assert not ring.put(MQTTMessage(0, "test", b"x", 0, False), block=False)
+        assert ring.dropped == 2
+    finally:
+        ring.stop()
+
+
+def _failing_handler(queue, msg):
+    if msg.payload == b"bad":
+        raise ValueError(msg.payload)
+    queue.put(msg.payload)
+
+
+def _on_error(queue, msg, e):
+    queue.put(repr(e))
+
+
+def test_ring_handler_error(ctx):
+    queue = ctx.SimpleQueue()
+    with RingDispatcher(
+        functools.partial(_failing_handler, queue),
+        workers=1,
+        context=ctx,
+        on_error=functools.partial(_on_error, queue),
+    ) as ring:
+        for payload in [b"bad", b"good"]:
+            ring.put(MQTTMessage(0, "test", payload, 0, False))
+
+    assert [queue.get(), queue.get()] == ["ValueError(b'bad')", b"good"]
+    assert ring.errors == 1
+
+
+def _slow_handler(msg):
+    time.sleep(10)
+
+
+def test_ring_stop_timeout(ctx):
+    ring = RingDispatcher(_slow_handler, workers=1, slots=1, context=ctx)
+    ring.start()
+    # the worker is stuck in the first message and the second one fills the ring
+    for _ in range(2):
+        ring.put(MQTTMessage(0, "test", b"x", 0, False))
+    started = time.monotonic()
+    ring.stop(timeout=0.2)
+    assert time.monotonic() - started < 2
+
+
+def test_ring_on_message(client, ctx):
+    queue = ctx.SimpleQueue()
+    count = 10
+
+    with RingDispatcher(
+        functools.partial(_handler, queue), workers=2, context=ctx
+    ) as ring:
+        client.on_message = ring.on_message
+        client.subscribe("test/ring", 1)
+        for i in range(count):
+            client.publish("test/ring", str(i), qos=1)
+        received = [queue.get() for _ in range(count)]
+
+    assert sorted(int(payload) for _, payload, _ in received) == list(range(count))